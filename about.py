@@ -1,34 +1,57 @@
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import streamlit as st
-import sqlite3
-
-
-# Função para carregar dados do SQLite
-def load_data():
-    # Conecta ao banco SQLite
-    conn = sqlite3.connect('violencia_dm.db')
+import math
 
-    # Lê os dados da tabela 'violencia_domestica' para um DataFrame
-    violencia_dm = pd.read_sql_query("SELECT * FROM violencia_domestica", conn)
+import streamlit as st
 
-    # Fecha a conexão com o banco
-    conn.close()
+import dados
+from instrumentacao import definir_visao, marcar
 
-    # Retorna apenas as 10 primeiras linhas do DataFrame
-    return violencia_dm.head(10)
+# Opções de linhas por página do navegador de dados
+TAMANHOS_PAGINA = [10, 25, 50, 100]
+SEM_ORDENACAO = '(ordem de carga)'
 
 
 # Função principal para exibir os dados
 def about():
     st.title("Exibição de Dados - Violência Doméstica")
+    definir_visao('About')
 
-    with st.spinner("Carregando dados..."):
-        data = load_data()
+    registros, estatisticas = dados.metadados_tabela()
+    marcar('metadados', estatisticas)
+    colunas = estatisticas['COLUNA'].tolist() if estatisticas is not None else []
 
     st.subheader("Dados de Referência")
+    coluna_tamanho, coluna_ordem, coluna_direcao = st.columns(3)
+    tamanho = coluna_tamanho.selectbox("Linhas por página:", TAMANHOS_PAGINA)
+    ordenar_por = coluna_ordem.selectbox("Ordenar por:", [SEM_ORDENACAO] + colunas)
+    decrescente = coluna_direcao.radio("Ordem:", ["Crescente", "Decrescente"], horizontal=True) == "Decrescente"
+
+    paginas = max(math.ceil((registros or 0) / tamanho), 1)
+    pagina = st.number_input("Página:", min_value=1, max_value=paginas, value=1, step=1)
+
+    with st.spinner("Carregando dados..."):
+        data = dados.pagina_dados(
+            pagina, tamanho, None if ordenar_por == SEM_ORDENACAO else ordenar_por, decrescente
+        )
+    marcar('consulta', data)
+
     st.dataframe(data)  # Exibe os dados em formato de tabela no Streamlit
+    if registros is not None:
+        st.caption(f"Página {pagina} de {paginas:,} — {registros:,} registros no total")
+
+    st.subheader("Estatísticas das Colunas")
+    if estatisticas is not None:
+        st.dataframe(estatisticas)
+    else:
+        st.info("Estatísticas indisponíveis: recarregue a planilha para calculá-las.")
+    marcar('renderizacao')
+
+    # O relatório de memória carrega os microdados completos, por isso só roda quando solicitado
+    with st.expander("Uso de memória dos microdados carregados"):
+        if st.checkbox("Calcular uso de memória (carrega todos os microdados)"):
+            microdados = dados.load_data()
+            marcar('consulta_completa', microdados)
+            st.dataframe(dados.relatorio_memoria(microdados))
+            marcar('relatorio_memoria')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+import os
+
+import pandas as pd
+
+import colunar
+from dados import (
+    DIMENSOES_RESUMO, MEDIDAS, TABELA, TABELA_RESUMO, condicoes_filtros, consulta_cacheada, normalizar_filtros
+)
+from geografia import municipios_ibge
+from previsoes import ANALISES, HORIZONTE_PADRAO, preditor_linear, preditor_temporal
+
+# Formatos de exportação e a extensão de cada arquivo
+FORMATOS = {'csv': '.csv', 'parquet': '.parquet', 'json': '.json'}
+
+
+# Função para ler a base compartilhada por todos os relatórios: TOTAL e CASOS no grão do cubo
+# (ANO x MUNICIPIO x REGIAO x NATUREZA x SEXO), com os filtros aplicados
+# Cada relatório é derivado desta tabela em memória, sem nova consulta ao banco
+# Filtros fora das dimensões do cubo (ex.: FAIXA_IDADE) são resolvidos na tabela de microdados
+def tabela_base(filtros=None):
+    filtros = normalizar_filtros(filtros)
+    tabela = TABELA_RESUMO if {coluna for coluna, _ in filtros} <= set(DIMENSOES_RESUMO) else TABELA
+    dimensoes = ', '.join(DIMENSOES_RESUMO)
+    condicoes, params = condicoes_filtros(filtros)
+    query = f"""
+        SELECT {dimensoes}, {MEDIDAS['TOTAL'][tabela]} AS TOTAL, {MEDIDAS['CASOS'][tabela]} AS CASOS
+        FROM {tabela}
+        {'WHERE ' + ' AND '.join(condicoes) if condicoes else ''}
+        GROUP BY {dimensoes}
+    """
+    return consulta_cacheada(('base_relatorios', filtros), query, params, bool(filtros))
+
+
+# Função para somar uma medida da base por um conjunto de colunas (mesmo resultado de dados.agregar)
+# Assim como no SQL, grupos com chave nula são descartados
+def somar(base, colunas, medida='TOTAL'):
+    return base.groupby(colunas, as_index=False, sort=True)[medida].sum()
+
+
+# Relatórios da aba de visualização, todos derivados da mesma base
+def regiao_por_ano(base):
+    return somar(base, ['ANO', 'REGIAO_GEOGRAFICA'])
+
+
+def casos_por_ano(base):
+    return somar(base, ['ANO'], 'CASOS')
+
+
+def regiao_por_sexo(base):
+    return somar(base, ['REGIAO_GEOGRAFICA', 'SEXO'])
+
+
+# Função para obter o crime com maior incidência em cada região geográfica
+def crime_maior_incidencia(base):
+    regiao_natureza = somar(base, ['REGIAO_GEOGRAFICA', 'NATUREZA'])
+    return regiao_natureza.loc[regiao_natureza.groupby('REGIAO_GEOGRAFICA')['TOTAL'].idxmax()].reset_index(drop=True)
+
+
+# Função para obter os 10 crimes mais relevantes de cada região geográfica
+def top_crimes_regiao(base, quantidade=10):
+    return (
+        somar(base, ['REGIAO_GEOGRAFICA', 'NATUREZA'])
+        .sort_values(['REGIAO_GEOGRAFICA', 'TOTAL'], ascending=[True, False])
+        .groupby('REGIAO_GEOGRAFICA')
+        .head(quantidade)
+        .reset_index(drop=True)
+    )
+
+
+def sexo_natureza(base):
+    return somar(base, ['SEXO', 'NATUREZA']).sort_values(['SEXO', 'TOTAL'], ascending=[True, False])
+
+
+# Função para obter o total por município com o código IBGE usado no mapa (nulo sem correspondência)
+def municipios(base):
+    return somar(base, ['MUNICIPIO']).merge(municipios_ibge(), on='MUNICIPIO', how='left')
+
+
+VISOES = {
+    'regiao_por_ano': regiao_por_ano,
+    'casos_por_ano': casos_por_ano,
+    'regiao_por_sexo': regiao_por_sexo,
+    'crime_maior_incidencia': crime_maior_incidencia,
+    'top_crimes_regiao': top_crimes_regiao,
+    'sexo_natureza': sexo_natureza,
+    'municipios': municipios,
+}
+
+
+# Função para calcular as previsões lineares de cada análise a partir da mesma base
+# (mesmos modelos de previsoes.calcular_previsao, sem nova consulta por análise)
+def previsoes(base, horizonte=HORIZONTE_PADRAO):
+    resultado = {}
+    for analise, coluna in ANALISES.items():
+        nome = f"previsao_{analise.lower()}"
+        if coluna is None:
+            historico = somar(base, ['ANO'])
+            resultado[nome] = (
+                preditor_temporal(historico, horizonte) if not historico.empty
+                else pd.DataFrame({'ANO': [], 'TOTAL': []})
+            )
+        else:
+            historico = somar(base, ['ANO', coluna])
+            resultado[nome] = (
+                preditor_linear(historico, coluna, 'TOTAL', horizonte) if not historico.empty
+                else pd.DataFrame({coluna: [], 'ANO': [], 'TOTAL': []})
+            )
+    return resultado
+
+
+# Função para gerar todos os relatórios em uma única leitura do banco
+# Com selecao=True inclui também os erros e as previsões da seleção automática de modelos
+def relatorios(filtros=None, horizonte=HORIZONTE_PADRAO, selecao=False):
+    base = tabela_base(filtros)
+    resultado = {nome: visao(base) for nome, visao in VISOES.items()}
+    resultado.update(previsoes(base, horizonte))
+    if selecao:
+        from selecao_modelos import SERIES, obter_selecao
+
+        for serie in SERIES:
+            erros, previstas = obter_selecao(serie, filtros, horizonte)
+            resultado[f"selecao_{serie.lower()}_erros"] = erros
+            resultado[f"selecao_{serie.lower()}_previsoes"] = previstas
+    return resultado
+
+
+# Função para gravar um relatório no formato escolhido
+def _gravar(df, caminho, formato):
+    if formato == 'csv':
+        df.to_csv(caminho, index=False)
+    elif formato == 'parquet':
+        df.to_parquet(caminho, index=False)
+    else:
+        df.to_json(caminho, orient='records', force_ascii=False, indent=2)
+
+
+# Função para exportar todos os relatórios para um diretório (um arquivo por relatório)
+# Retorna os caminhos gravados
+def exportar(destino, formato='csv', filtros=None, horizonte=HORIZONTE_PADRAO, selecao=False):
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    if formato == 'parquet' and not colunar.disponivel():
+        raise RuntimeError("A exportação em Parquet requer o pyarrow instalado")
+    os.makedirs(destino, exist_ok=True)
+    caminhos = []
+    for nome, df in relatorios(filtros, horizonte, selecao).items():
+        caminho = os.path.join(destino, nome + FORMATOS[formato])
+        _gravar(df, caminho, formato)
+        caminhos.append(caminho)
+    return caminhos
+
+
+# Função para converter os argumentos de filtro da linha de comando no dicionário de filtros
+# --ano 2020 2023 define o intervalo de anos e --filtro COLUNA=VALOR1,VALOR2 as demais colunas
+def _filtros_argumentos(ano, filtros):
+    resultado = {}
+    if ano:
+        resultado['ANO'] = tuple(ano)
+    for filtro in filtros or []:
+        coluna, separador, valores = filtro.partition('=')
+        if not separador:
+            raise ValueError(f"Filtro inválido (use COLUNA=VALOR1,VALOR2): {filtro}")
+        resultado.setdefault(coluna.strip().upper(), []).extend(
+            valor.strip() for valor in valores.split(',') if valor.strip()
+        )
+    return resultado
+
+
+# Exportação pela linha de comando, sem Streamlit (ex.: para os relatórios agendados)
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Exporta os agregados e as previsões do painel sem o Streamlit.')
+    parser.add_argument('destino', help='Diretório onde os arquivos serão gravados')
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv')
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE_PADRAO, help='Anos de previsão')
+    parser.add_argument('--ano', type=int, nargs=2, metavar=('INICIO', 'FIM'), help='Intervalo de anos')
+    parser.add_argument('--filtro', action='append', metavar='COLUNA=VALORES',
+                        help='Filtro por coluna (repetível), ex.: --filtro NATUREZA=AMEACA,INJURIA')
+    parser.add_argument('--selecao', action='store_true', help='Incluir a seleção automática de modelos')
+    argumentos = parser.parse_args()
+
+    try:
+        filtros = _filtros_argumentos(argumentos.ano, argumentos.filtro)
+        inicio = time.perf_counter()
+        caminhos = exportar(argumentos.destino, argumentos.formato, filtros, argumentos.horizonte, argumentos.selecao)
+    except (ValueError, RuntimeError) as erro:
+        parser.error(str(erro))
+    print(f"{len(caminhos)} relatórios gravados em {argumentos.destino} ({time.perf_counter() - inicio:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+# Valores usados na geração dos microdados sintéticos (mesmo esquema da tabela violencia_domestica)
+REGIOES = ['CAPITAL', 'METROPOLITANA', 'ZONA DA MATA', 'AGRESTE', 'SERTAO']
+NATUREZAS = [
+    'AMEACA', 'LESAO CORPORAL', 'VIAS DE FATO', 'INJURIA', 'ESTUPRO', 'DIFAMACAO', 'CALUNIA', 'DANO'
+]
+SEXOS = ['FEMININO', 'MASCULINO']
+FAIXAS_IDADE = [
+    '0 A 11 ANOS', '12 A 17 ANOS', '18 A 24 ANOS', '25 A 29 ANOS', '30 A 34 ANOS', '35 A 64 ANOS',
+    '65 ANOS OU MAIS', 'NÃO INFORMADO'
+]
+COLUNAS = ['MUNICIPIO', 'NATUREZA', 'DATA_FATO', 'ANO', 'SEXO', 'FAIXA_IDADE', 'TOTAL', 'REGIAO_GEOGRAFICA']
+DATA_INICIAL = datetime.date(2015, 1, 1)
+DATA_FINAL = datetime.date(2024, 8, 31)
+
+# Linhas de referência (escala 1) quando não houver banco real para medir
+LINHAS_PADRAO = 100_000
+
+# Agregações de cada análise da aba de visualização: colunas e medida
+AGREGACOES = {
+    'Distribuição de Crimes - Região Geográfica': (['ANO', 'REGIAO_GEOGRAFICA'], 'TOTAL'),
+    'Total de Casos em Pernambuco': (['ANO'], 'CASOS'),
+    'Total de Casos por Região Geográfica': (['REGIAO_GEOGRAFICA', 'SEXO'], 'TOTAL'),
+    'Crime com Maior Incidência': (['REGIAO_GEOGRAFICA', 'NATUREZA'], 'TOTAL'),
+    'Crimes Domésticos Por Sexo e Natureza': (['SEXO', 'NATUREZA'], 'TOTAL'),
+    'Mapa de Crimes por Município': (['MUNICIPIO'], 'TOTAL'),
+}
+
+# Análises respondidas pelos cubos de contagem: cubo, dimensões mantidas e filtros
+CONSULTAS_CUBO = {
+    'mês x dia da semana': ('temporal', ['DIA_SEMANA', 'MES'], None),
+    'ano x faixa etária [NATUREZA=AMEACA]': ('temporal', ['ANO', 'FAIXA_IDADE'], {'NATUREZA': ['AMEACA']}),
+    'sazonalidade [MUNICIPIO=RECIFE]': ('municipal', ['ANO', 'MES'], {'MUNICIPIO': ['RECIFE']}),
+    'mês x dia da semana [SEXO=FEMININO, fora do cubo]': ('temporal', ['DIA_SEMANA', 'MES'], {'SEXO': ['FEMININO']}),
+}
+
+# Filtros medidos sobre a agregação ANO x NATUREZA (cubo e tabela de microdados)
+FILTROS = {
+    'ano e região (cubo)': {'ANO': (2018, 2022), 'REGIAO_GEOGRAFICA': ['AGRESTE', 'SERTAO']},
+    'faixa de idade (microdados)': {'FAIXA_IDADE': ['18 A 24 ANOS', '25 A 29 ANOS']},
+}
+
+
+# Função para gerar os microdados sintéticos em blocos, sem montar a tabela inteira em memória
+def gerar_linhas(quantidade, semente=42, bloco=50_000):
+    from geografia import carregar_geojson
+
+    gerador = np.random.default_rng(semente)
+    municipios = np.array(sorted({
+        feature['properties']['description'].upper() for feature in carregar_geojson()['features']
+    }))
+    regiao_municipio = gerador.choice(REGIOES, size=len(municipios))
+    dias = (DATA_FINAL - DATA_INICIAL).days + 1
+    datas = np.array([(DATA_INICIAL + datetime.timedelta(days=int(dia))).isoformat() for dia in range(dias)])
+
+    geradas = 0
+    while geradas < quantidade:
+        tamanho = min(bloco, quantidade - geradas)
+        municipio = gerador.integers(len(municipios), size=tamanho)
+        dia = gerador.integers(dias, size=tamanho)
+        colunas = [
+            municipios[municipio],
+            gerador.choice(NATUREZAS, size=tamanho, p=_pesos(len(NATUREZAS))),
+            datas[dia],
+            [int(data[:4]) for data in datas[dia]],
+            gerador.choice(SEXOS, size=tamanho, p=[0.85, 0.15]),
+            gerador.choice(FAIXAS_IDADE, size=tamanho),
+            gerador.choice([1, 1, 1, 2, 3], size=tamanho).tolist(),
+            regiao_municipio[municipio],
+        ]
+        yield from zip(*[
+            coluna.tolist() if isinstance(coluna, np.ndarray) else coluna for coluna in colunas
+        ])
+        geradas += tamanho
+
+
+# Pesos decrescentes (algumas naturezas muito mais frequentes que outras, como nos dados reais)
+def _pesos(quantidade):
+    pesos = 1 / np.arange(1, quantidade + 1)
+    return pesos / pesos.sum()
+
+
+# Função para gravar os microdados sintéticos em uma planilha com os nomes de colunas originais
+def gravar_planilha(caminho, linhas):
+    from openpyxl import Workbook
+    from ingestao import RENOMEAR_COLUNAS
+
+    originais = {novo: original for original, novo in RENOMEAR_COLUNAS.items()}
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    planilha.append([originais.get(coluna, coluna) for coluna in COLUNAS])
+    for linha in linhas:
+        planilha.append(linha)
+    workbook.save(caminho)
+
+
+# Função para medir o tempo de uma etapa (mínimo e mediana das repetições)
+# antes() roda fora da medição a cada repetição (ex.: esvaziar o cache para medir a leitura a frio)
+def medir(resultados, etapa, nome, funcao, repeticoes=1, antes=None):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    resultados.append({
+        'etapa': etapa,
+        'nome': nome,
+        'repeticoes': repeticoes,
+        'minimo_s': round(min(tempos), 6),
+        'mediana_s': round(statistics.median(tempos), 6),
+        'linhas': len(resultado) if hasattr(resultado, '__len__') else None,
+    })
+    print(f"{etapa:<12} {nome:<55} {min(tempos):>10.4f} s")
+    return resultado
+
+
+# Função para montar o mapa coroplético da aba de visualização (figura e serialização)
+def figura_mapa(dados_municipios, tolerancia):
+    import plotly.express as px
+    from geografia import geojson_simplificado, municipios_ibge
+
+    agrupados = (
+        dados_municipios.merge(municipios_ibge(), on='MUNICIPIO')
+        .dropna(subset=['ID_IBGE'])
+        .astype({'ID_IBGE': int})
+    )
+    fig = px.choropleth(
+        agrupados,
+        geojson=geojson_simplificado(tolerancia),
+        locations='ID_IBGE',
+        hover_name='MUNICIPIO',
+        color='TOTAL',
+        color_continuous_scale='Viridis',
+    )
+    fig.update_geos(fitbounds="locations", visible=False)
+    return fig.to_json()
+
+
+# Função para remover o banco de benchmark e seus arquivos auxiliares
+def _remover_banco(caminho):
+    from conexoes import fechar_conexoes
+
+    fechar_conexoes()
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+
+# Função para descobrir o número de registros do banco real (escala 1)
+def linhas_referencia(caminho='violencia_dm.db'):
+    import sqlite3
+    from conexoes import leitura
+    from dados import ler_metadado
+
+    if not os.path.exists(caminho):
+        return LINHAS_PADRAO
+    try:
+        with leitura(caminho) as conn:
+            registros = ler_metadado(conn, 'registros')
+    except sqlite3.OperationalError:
+        return LINHAS_PADRAO
+    return int(registros) if registros else LINHAS_PADRAO
+
+
+# Função para executar o benchmark completo em um banco sintético
+def executar(linhas, caminho_banco, repeticoes=3, excel=False, semente=42):
+    import plotly.io as pio
+
+    import cubos
+    import dados
+    import ingestao
+    from cache_figuras import figura_cacheada
+    from conexoes import escrita
+    from geografia import NIVEIS_DETALHE, geojson_simplificado
+    from previsoes import ANALISES, calcular_previsao, precomputar_previsoes, preditor_linear
+
+    resultados = []
+    _remover_banco(caminho_banco)
+
+    # Carga: da planilha (caminho completo do app) ou direto das linhas geradas
+    with escrita(caminho_banco) as conn:
+        if excel:
+            planilha = os.path.join(os.path.dirname(caminho_banco), 'benchmark.xlsx')
+            medir(resultados, 'geracao', 'planilha sintética',
+                  lambda: gravar_planilha(planilha, gerar_linhas(linhas, semente)))
+            medir(resultados, 'carga', 'ingerir_excel (planilha -> SQLite)',
+                  lambda: ingestao.ingerir_excel(conn, planilha))
+        else:
+            medir(resultados, 'carga', 'gravar_linhas (SQLite, índices, cubo, metadados)',
+                  lambda: ingestao.gravar_linhas(conn, COLUNAS, gerar_linhas(linhas, semente), linhas))
+            medir(resultados, 'carga', 'precomputar_previsoes', lambda: precomputar_previsoes(conn))
+    dados.invalidar_cache()
+
+    # Leitura dos microdados (a frio, sem cache, e a quente)
+    variantes = {
+        'load_data()': lambda: dados.load_data(),
+        "load_data(colunas=['ANO', 'NATUREZA', 'TOTAL'])": lambda: dados.load_data(['ANO', 'NATUREZA', 'TOTAL']),
+        'load_data(anos=[2023, 2024])': lambda: dados.load_data(anos=[2023, 2024]),
+        'pagina_dados(pagina=100, ordenar_por=ANO)': lambda: dados.pagina_dados(100, 50, 'ANO'),
+    }
+    for nome, funcao in variantes.items():
+        medir(resultados, 'leitura', f"{nome} [frio]", funcao, repeticoes, antes=dados.invalidar_cache)
+        medir(resultados, 'leitura', f"{nome} [quente]", funcao, repeticoes)
+
+    # Agregações de cada análise da aba de visualização
+    for nome, (colunas, medida) in AGREGACOES.items():
+        medir(resultados, 'agregacao', f"{nome} [frio]", lambda: dados.agregar(colunas, medida),
+              repeticoes, antes=dados.invalidar_cache)
+        medir(resultados, 'agregacao', f"{nome} [quente]", lambda: dados.agregar(colunas, medida), repeticoes)
+    for nome, filtros in FILTROS.items():
+        medir(resultados, 'agregacao', f"filtro {nome} [frio]",
+              lambda: dados.agregar(['ANO', 'NATUREZA'], filtros=filtros), repeticoes, antes=dados.invalidar_cache)
+
+    # Cubos de contagem: leitura do cubo gravado (a frio) e respostas das análises por redução de arrays
+    with escrita(caminho_banco) as conn:
+        medir(resultados, 'cubo', 'gravar_cubos (temporal e municipal)', lambda: cubos.gravar_cubos(conn))
+    medir(resultados, 'cubo', 'obter_cubo temporal [frio]', lambda: cubos.obter_cubo('temporal'),
+          antes=cubos._cubo_gravado.cache_clear)
+    for nome, (cubo, dimensoes, filtros) in CONSULTAS_CUBO.items():
+        medir(resultados, 'cubo', nome,
+              lambda: cubos.reduzir(cubos.obter_cubo(cubo, filtros), dimensoes), repeticoes,
+              antes=cubos._cubo_filtrado.cache_clear)
+
+    # Previsões: regressão linear vetorizada de cada agrupamento e total geral com scikit-learn
+    for analise, coluna in ANALISES.items():
+        if coluna is None:
+            medir(resultados, 'previsao', 'preditor_temporal', lambda: calcular_previsao(analise), repeticoes)
+            continue
+        historico = dados.agregar(['ANO', coluna])
+        medir(resultados, 'previsao', f"preditor_linear por {coluna}",
+              lambda: preditor_linear(historico, coluna, 'TOTAL'), repeticoes)
+
+    # Mapa: simplificação do GeoJSON (a frio) e figura coroplética com serialização
+    municipios = dados.agregar(['MUNICIPIO'])
+    for detalhe, tolerancia in NIVEIS_DETALHE.items():
+        medir(resultados, 'mapa', f"geojson_simplificado [{detalhe}]", lambda: geojson_simplificado(tolerancia),
+              antes=geojson_simplificado.cache_clear)
+        medir(resultados, 'mapa', f"choropleth + to_json [{detalhe}]",
+              lambda: figura_mapa(municipios, tolerancia), repeticoes)
+        # Mesma figura lida do cache em disco (a primeira chamada grava o arquivo)
+        def construir():
+            return pio.from_json(figura_mapa(municipios, tolerancia))
+
+        figura_cacheada('benchmark mapa', None, construir, extras=detalhe)
+        medir(resultados, 'mapa', f"figura_cacheada [{detalhe}]",
+              lambda: figura_cacheada('benchmark mapa', None, construir, extras=detalhe), repeticoes)
+
+    return resultados
+
+
+# Função para descrever o ambiente da medição (para comparar resultados entre máquinas)
+def ambiente():
+    import pandas as pd
+    import sqlite3
+
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da carga, leitura, agregações, previsões e mapa.')
+    parser.add_argument('--linhas', type=int, help='Linhas na escala 1 (padrão: registros do banco real)')
+    parser.add_argument('--escala', type=float, nargs='+', default=[1],
+                        help='Multiplicadores das linhas (ex.: 1 10 100)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--banco', help='Arquivo SQLite do benchmark (padrão: diretório temporário)')
+    parser.add_argument('--excel', action='store_true', help='Medir a carga a partir de uma planilha .xlsx sintética')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='benchmark_resultados.json')
+    argumentos = parser.parse_args()
+
+    caminho_banco = argumentos.banco or os.path.join(tempfile.mkdtemp(prefix='violencia_benchmark_'), 'benchmark.db')
+    # Os caminhos precisam estar definidos antes de importar os módulos do app
+    os.environ['VIOLENCIA_BANCO'] = caminho_banco
+    os.environ['VIOLENCIA_FIGURAS'] = os.path.join(os.path.dirname(caminho_banco), 'figuras')
+
+    base = argumentos.linhas or linhas_referencia()
+    execucoes = []
+    for escala in argumentos.escala:
+        linhas = int(base * escala)
+        print(f"\n== escala {escala:g}: {linhas:,} linhas ==")
+        inicio = time.perf_counter()
+        resultados = executar(linhas, caminho_banco, argumentos.repeticoes, argumentos.excel, argumentos.semente)
+        execucoes.append({
+            'escala': escala,
+            'linhas': linhas,
+            'total_s': round(time.perf_counter() - inicio, 3),
+            'resultados': resultados,
+        })
+
+    relatorio = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'ambiente': ambiente(),
+        'parametros': {
+            'linhas_base': base,
+            'repeticoes': argumentos.repeticoes,
+            'excel': argumentos.excel,
+            'semente': argumentos.semente,
+        },
+        'execucoes': execucoes,
+    }
+    with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {argumentos.saida}")
+
+
+if __name__ == '__main__':
+    main()
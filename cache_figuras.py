@@ -0,0 +1,119 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+import plotly
+import plotly.io as pio
+
+from dados import normalizar_filtros, versao_conteudo
+from geografia import ARQUIVO_GEOJSON
+
+# Diretório das figuras serializadas, compartilhado por todas as sessões e processos do app
+DIRETORIO_FIGURAS = os.environ.get('VIOLENCIA_FIGURAS', 'cache_figuras')
+
+# Tamanho máximo do diretório (bytes); acima dele as figuras usadas há mais tempo são removidas
+MAXIMO_BYTES = int(os.environ.get('VIOLENCIA_FIGURAS_MAXIMO', 64 * 1024 * 1024))
+
+_limpeza_lock = threading.Lock()
+
+
+# Função para identificar o código que gera as figuras: hash dos módulos do app, do GeoJSON e da versão do Plotly
+# Qualquer alteração em um gráfico muda o formato, e as figuras gravadas antes dela deixam de ser lidas
+@lru_cache(maxsize=1)
+def formato_figuras():
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    arquivos = sorted(glob.glob(os.path.join(diretorio, '*.py'))) + [ARQUIVO_GEOJSON]
+    resumo = hashlib.sha1(plotly.__version__.encode('utf-8'))
+    for caminho in arquivos:
+        try:
+            with open(caminho, 'rb') as arquivo:
+                resumo.update(os.path.basename(caminho).encode('utf-8') + b'\0' + arquivo.read())
+        except OSError:
+            pass
+    return resumo.hexdigest()[:16]
+
+
+# Função para gerar o arquivo de uma figura a partir do formato, da versão dos dados, da análise, dos filtros
+# e de parâmetros extras da visualização (ex.: o nível de detalhe do mapa)
+def _arquivo(versao, analise, filtros, extras):
+    chave = json.dumps(
+        [formato_figuras(), versao, analise, normalizar_filtros(filtros), extras], ensure_ascii=False, default=str
+    )
+    return os.path.join(DIRETORIO_FIGURAS, hashlib.sha1(chave.encode('utf-8')).hexdigest() + '.json')
+
+
+# Função para ler uma figura gravada (None se não existir ou estiver corrompida)
+# A data de modificação é atualizada a cada leitura e serve de ordem para a remoção (LRU)
+def _ler(arquivo):
+    try:
+        with open(arquivo, encoding='utf-8') as entrada:
+            texto = entrada.read()
+        os.utime(arquivo)
+        return pio.from_json(texto)
+    except (OSError, ValueError):
+        return None
+
+
+# Função para gravar a figura de forma atômica (outro processo nunca lê um arquivo pela metade)
+def _gravar(arquivo, figura):
+    os.makedirs(DIRETORIO_FIGURAS, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=DIRETORIO_FIGURAS, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'w', encoding='utf-8') as saida:
+            saida.write(figura.to_json())
+        os.replace(temporario, arquivo)
+    except OSError:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return
+    limitar_tamanho()
+
+
+# Função para manter o diretório abaixo de MAXIMO_BYTES removendo as figuras menos usadas
+def limitar_tamanho(maximo_bytes=None):
+    maximo_bytes = MAXIMO_BYTES if maximo_bytes is None else maximo_bytes
+    with _limpeza_lock:
+        try:
+            arquivos = [entrada for entrada in os.scandir(DIRETORIO_FIGURAS) if entrada.name.endswith('.json')]
+        except OSError:
+            return
+        estados = []
+        for entrada in arquivos:
+            try:
+                estado = entrada.stat()
+                estados.append((estado.st_mtime, estado.st_size, entrada.path))
+            except OSError:
+                pass
+        total = sum(tamanho for _, tamanho, _ in estados)
+        for _, tamanho, caminho in sorted(estados):
+            if total <= maximo_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= tamanho
+
+
+# Função para obter a figura de uma análise: lida do disco quando já foi gerada para a versão atual
+# dos dados e os mesmos filtros; caso contrário construir() monta a figura, que é gravada para os próximos
+# acessos. Uma nova carga (ou mudança no código) altera a chave, então figuras antigas saem pela limpeza
+def figura_cacheada(analise, filtros, construir, extras=None):
+    versao = versao_conteudo()
+    if versao is None:
+        return construir()
+    arquivo = _arquivo(versao, analise, filtros, extras)
+    figura = _ler(arquivo)
+    if figura is None:
+        figura = construir()
+        _gravar(arquivo, figura)
+    return figura
+
+
+# Função para apagar todas as figuras gravadas
+def limpar_figuras():
+    limitar_tamanho(0)
@@ -0,0 +1,107 @@
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+
+from conexoes import leitura
+from dados import COLUNAS_CATEGORICAS, TABELA, colunas_dados, ler_metadado
+
+DIRETORIO_PARQUET = 'violencia_dm_parquet'
+ARQUIVO_VERSAO = '_versao'
+PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+
+# Função para verificar se o pyarrow está instalado (dependência opcional)
+def disponivel():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Função para obter a versão dos dados gravada no banco (assinatura da última planilha carregada)
+def _versao_banco(conn):
+    return ler_metadado(conn, 'arquivo_excel') or ''
+
+
+# Função para verificar se o dataset Parquet corresponde à versão atual do banco
+def atualizado(conn, diretorio=DIRETORIO_PARQUET):
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_VERSAO), encoding='utf-8') as arquivo:
+            return arquivo.read() == _versao_banco(conn)
+    except FileNotFoundError:
+        return False
+
+
+# Função para gravar uma partição (um ANO) do dataset
+def _gravar_particao(conn, diretorio, colunas, ano):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    selecao = ', '.join(f'"{coluna}"' for coluna in colunas if coluna != 'ANO')
+    if ano is None:
+        dados = pd.read_sql_query(f"SELECT {selecao} FROM {TABELA} WHERE ANO IS NULL", conn)
+        pasta = os.path.join(diretorio, f'ANO={PARTICAO_NULA}')
+    else:
+        dados = pd.read_sql_query(f"SELECT {selecao} FROM {TABELA} WHERE ANO = ?", conn, params=(ano,))
+        pasta = os.path.join(diretorio, f'ANO={ano}')
+
+    tabela = pa.Table.from_pandas(dados, preserve_index=False)
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in tabela.column_names:
+            indice = tabela.column_names.index(coluna)
+            tabela = tabela.set_column(indice, coluna, pc.dictionary_encode(tabela[coluna]))
+
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, 'parte-0.parquet')
+    pq.write_table(tabela, destino + '.tmp', compression='zstd')
+    os.replace(destino + '.tmp', destino)
+
+
+# Função para exportar os microdados do SQLite para um dataset Parquet particionado por ANO
+# Com anos informados, regrava apenas essas partições (carga incremental)
+def exportar_parquet(conn, diretorio=DIRETORIO_PARQUET, anos=None):
+    colunas = colunas_dados(conn)
+    if anos is None:
+        if os.path.isdir(diretorio):
+            shutil.rmtree(diretorio)
+        anos = [linha[0] for linha in conn.execute(f"SELECT DISTINCT ANO FROM {TABELA}")]
+    os.makedirs(diretorio, exist_ok=True)
+
+    for ano in anos:
+        _gravar_particao(conn, diretorio, colunas, ano)
+
+    with open(os.path.join(diretorio, ARQUIVO_VERSAO), 'w', encoding='utf-8') as arquivo:
+        arquivo.write(_versao_banco(conn))
+
+
+# Função para ler o dataset Parquet com poda de colunas e de partições (ANO)
+# Os arquivos são lidos por memory-mapping e as colunas categóricas chegam como pandas Categorical
+def ler_parquet(colunas=None, anos=None, diretorio=DIRETORIO_PARQUET):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    particionamento = ds.partitioning(pa.schema([('ANO', pa.int32())]), flavor='hive')
+    dataset = ds.dataset(
+        diretorio,
+        format='parquet',
+        partitioning=particionamento,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    filtro = ds.field('ANO').isin(list(anos)) if anos is not None else None
+    return dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+
+
+# Função para verificar se o dataset Parquet pode ser usado no lugar do SQLite
+def pronto(diretorio=DIRETORIO_PARQUET):
+    if not disponivel() or not os.path.isdir(diretorio):
+        return False
+    try:
+        with leitura() as conn:
+            return atualizado(conn, diretorio)
+    except sqlite3.OperationalError:
+        return False
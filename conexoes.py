@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Caminho do banco SQLite (VIOLENCIA_BANCO permite usar outro arquivo, ex.: no benchmark)
+CAMINHO_BANCO = os.environ.get('VIOLENCIA_BANCO', 'violencia_dm.db')
+
+# Conexões de leitura mantidas abertas por banco (as excedentes são fechadas ao serem devolvidas)
+MAXIMO_LEITURA = 8
+
+# Ajustes das conexões: mapeamento do arquivo em memória (bytes) e cache de páginas (KiB, valor negativo)
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE = -32768
+
+# Tempo de espera (ms) por um lock do SQLite antes de falhar
+BUSY_TIMEOUT = 30000
+
+# Pool de conexões somente leitura e conexão única de escrita, por caminho do banco
+# As conexões não ficam presas a uma thread: o Streamlit executa cada rerun em uma thread própria,
+# então cada uso retira uma conexão do pool e a devolve ao final
+_leitura = {}
+_leitura_lock = threading.Lock()
+_escrita = {}
+_escrita_lock = threading.RLock()
+
+
+# Função para aplicar os ajustes de desempenho comuns às conexões
+def _configurar(conn):
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={CACHE_SIZE}")
+
+
+# Função para abrir uma conexão somente leitura (URI mode=ro); falha se o banco não existir
+def _abrir_leitura(caminho):
+    uri = f"file:{quote(os.path.abspath(caminho))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    _configurar(conn)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+# Função para abrir a conexão de escrita; o modo WAL fica gravado no arquivo e permite
+# que as leituras continuem enquanto uma carga está em andamento
+def _abrir_escrita(caminho):
+    conn = sqlite3.connect(caminho, check_same_thread=False)
+    _configurar(conn)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+# Gerenciador de contexto que empresta uma conexão somente leitura do pool
+@contextmanager
+def leitura(caminho=None):
+    caminho = caminho or CAMINHO_BANCO
+    with _leitura_lock:
+        livres = _leitura.setdefault(caminho, [])
+        conn = livres.pop() if livres else None
+    if conn is None:
+        conn = _abrir_leitura(caminho)
+    try:
+        yield conn
+    finally:
+        with _leitura_lock:
+            livres = _leitura.setdefault(caminho, [])
+            if len(livres) < MAXIMO_LEITURA:
+                livres.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+# Gerenciador de contexto com acesso exclusivo à conexão de escrita do processo
+# Confirma a transação ao final e a desfaz em caso de erro ou interrupção (ex.: rerun do Streamlit)
+@contextmanager
+def escrita(caminho=None):
+    caminho = caminho or CAMINHO_BANCO
+    with _escrita_lock:
+        conn = _escrita.get(caminho)
+        if conn is None:
+            conn = _escrita[caminho] = _abrir_escrita(caminho)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# Função para fechar todas as conexões abertas (ex.: antes de apagar ou substituir o arquivo do banco)
+def fechar_conexoes():
+    with _escrita_lock, _leitura_lock:
+        for conn in _escrita.values():
+            conn.close()
+        for livres in _leitura.values():
+            for conn in livres:
+                conn.close()
+        _escrita.clear()
+        _leitura.clear()
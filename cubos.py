@@ -0,0 +1,216 @@
+import io
+import sqlite3
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from conexoes import leitura
+from dados import TABELA, condicoes_filtros, ler_metadado, normalizar_filtros, versao_conteudo
+
+TABELA_CUBOS = 'cubos_contagem'
+
+# Cubos de contagem gravados na carga e as dimensões de cada um (na ordem dos eixos do array)
+CUBOS = {
+    'temporal': ['ANO', 'MES', 'DIA_SEMANA', 'FAIXA_IDADE', 'NATUREZA'],
+    'municipal': ['ANO', 'MES', 'MUNICIPIO'],
+}
+
+# Expressões SQL das dimensões derivadas de DATA_FATO (AAAA-MM-DD); as demais são colunas da tabela
+# DIA_SEMANA segue o strftime do SQLite: 0 = domingo
+EXPRESSOES = {
+    'MES': "CAST(substr(DATA_FATO, 6, 2) AS INTEGER)",
+    'DIA_SEMANA': "CAST(strftime('%w', DATA_FATO) AS INTEGER)",
+}
+
+# Valores fixos das dimensões de calendário (os eixos não dependem dos dados carregados)
+ROTULOS_FIXOS = {
+    'MES': np.arange(1, 13),
+    'DIA_SEMANA': np.arange(7),
+}
+
+NOMES_MESES = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+NOMES_DIAS = ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb']
+
+MEDIDAS_CUBO = ['TOTAL', 'CASOS']
+
+# Formato dos cubos gravados: incrementar ao mudar o conteúdo do BLOB (cubos de outro formato são refeitos)
+FORMATO_CUBOS = 2
+
+
+# Função para montar um cubo a partir dos microdados: o SQLite agrega as combinações existentes e o NumPy
+# distribui as contagens em um array denso cujos eixos são as dimensões codificadas por dicionário
+# Retorna {'dimensoes': [...], 'rotulos': {dimensao: valores}, 'periodo': [primeiro, último mês], 'TOTAL': array,
+# 'CASOS': array}
+def montar_cubo(conn, nome, filtros=()):
+    dimensoes = CUBOS[nome]
+    selecao = ', '.join(f"{EXPRESSOES.get(dimensao, dimensao)} AS {dimensao}" for dimensao in dimensoes)
+    condicoes, params = condicoes_filtros(filtros)
+    nao_nulas = [f"{dimensao} IS NOT NULL" for dimensao in dimensoes if dimensao not in EXPRESSOES]
+    filtro = ' AND '.join(["DATA_FATO IS NOT NULL"] + nao_nulas + condicoes)
+    agregados = pd.read_sql_query(f"""
+        SELECT {selecao}, SUM(TOTAL) AS TOTAL, COUNT(*) AS CASOS
+        FROM {TABELA}
+        WHERE {filtro}
+        GROUP BY {', '.join(dimensoes)}
+    """, conn, params=params).dropna(subset=dimensoes)
+    # Datas fora do formato AAAA-MM-DD geram mês ou dia inválidos e ficam fora do cubo
+    for dimensao, valores in ROTULOS_FIXOS.items():
+        if dimensao in dimensoes:
+            agregados = agregados[agregados[dimensao].between(valores[0], valores[-1])]
+
+    rotulos, codigos = {}, []
+    for dimensao in dimensoes:
+        valores = agregados[dimensao].to_numpy()
+        if dimensao in ROTULOS_FIXOS:
+            rotulos[dimensao] = ROTULOS_FIXOS[dimensao]
+            codigos.append(valores.astype(int) - rotulos[dimensao][0])
+        else:
+            rotulos[dimensao], codigo = np.unique(valores.astype(int if dimensao == 'ANO' else str),
+                                                  return_inverse=True)
+            codigos.append(codigo)
+    forma = tuple(len(rotulos[dimensao]) for dimensao in dimensoes)
+
+    cubo = {'dimensoes': dimensoes, 'rotulos': rotulos, 'periodo': _periodo_observado(conn)}
+    posicoes = np.ravel_multi_index(codigos, forma) if len(agregados) else np.array([], dtype=int)
+    for medida in MEDIDAS_CUBO:
+        cubo[medida] = np.bincount(
+            posicoes, weights=agregados[medida].to_numpy(dtype=float), minlength=int(np.prod(forma))
+        ).astype(np.int64).reshape(forma)
+    return cubo
+
+
+# Função para obter o primeiro e o último mês com registros em toda a base (índice ANO * 12 + MES - 1)
+# Meses fora do período ainda não foram publicados: no cubo aparecem com zero, mas não são observações
+def _periodo_observado(conn):
+    primeiro, ultimo = conn.execute(f"""
+        SELECT MIN(substr(DATA_FATO, 1, 7)), MAX(substr(DATA_FATO, 1, 7))
+        FROM {TABELA}
+        WHERE DATA_FATO GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*'
+    """).fetchone()
+    if primeiro is None:
+        return np.array([0, -1])
+    return np.array([int(data[:4]) * 12 + int(data[5:7]) - 1 for data in (primeiro, ultimo)])
+
+
+# Função para marcar as linhas (com colunas ANO e MES) que estão dentro do período observado dos dados
+def meses_observados(cubo, quadro):
+    indice = quadro['ANO'].to_numpy() * 12 + quadro['MES'].to_numpy() - 1
+    return (indice >= cubo['periodo'][0]) & (indice <= cubo['periodo'][1])
+
+
+# Funções para serializar o cubo em um BLOB (formato .npz do NumPy, sem pickle) e lê-lo de volta
+def _serializar(cubo):
+    arrays = {medida: cubo[medida] for medida in MEDIDAS_CUBO}
+    arrays['dimensoes'] = np.array(cubo['dimensoes'])
+    arrays['periodo'] = cubo['periodo']
+    arrays.update({f"rotulo_{dimensao}": valores for dimensao, valores in cubo['rotulos'].items()})
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _desserializar(dados):
+    with np.load(io.BytesIO(dados), allow_pickle=False) as arquivo:
+        dimensoes = [str(dimensao) for dimensao in arquivo['dimensoes']]
+        cubo = {
+            'dimensoes': dimensoes,
+            'rotulos': {d: arquivo[f"rotulo_{d}"] for d in dimensoes},
+            'periodo': arquivo['periodo'],
+        }
+        cubo.update({medida: arquivo[medida] for medida in MEDIDAS_CUBO})
+    return cubo
+
+
+# Função para identificar os cubos gravados: versão dos dados e formato do cubo
+def _etiqueta(versao):
+    return f"{versao}/{FORMATO_CUBOS}"
+
+
+# Função para montar e gravar todos os cubos com a versão atual dos dados (chamada na carga)
+def gravar_cubos(conn):
+    versao = _etiqueta(ler_metadado(conn, 'versao_dados'))
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_CUBOS} (NOME TEXT PRIMARY KEY, VERSAO TEXT, DADOS BLOB)")
+    for nome in CUBOS:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {TABELA_CUBOS} VALUES (?, ?, ?)",
+            (nome, versao, _serializar(montar_cubo(conn, nome)))
+        )
+
+
+# Função para verificar se todos os cubos gravados correspondem à versão atual dos dados
+def cubos_atualizados(conn):
+    versao = ler_metadado(conn, 'versao_dados')
+    try:
+        versoes = dict(conn.execute(f"SELECT NOME, VERSAO FROM {TABELA_CUBOS}").fetchall())
+    except sqlite3.OperationalError:
+        return False
+    return versao is not None and all(versoes.get(nome) == _etiqueta(versao) for nome in CUBOS)
+
+
+# Função para ler um cubo gravado, em cache por versão dos dados (None se não houver cubo da versão)
+@lru_cache(maxsize=len(CUBOS))
+def _cubo_gravado(versao, nome):
+    try:
+        with leitura() as conn:
+            linha = conn.execute(
+                f"SELECT DADOS FROM {TABELA_CUBOS} WHERE NOME = ? AND VERSAO = ?", (nome, _etiqueta(versao))
+            ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return _desserializar(linha[0]) if linha else None
+
+
+# Função para montar um cubo com filtros em colunas que não são dimensões dele, em cache por versão
+@lru_cache(maxsize=16)
+def _cubo_filtrado(versao, nome, filtros):
+    with leitura() as conn:
+        return montar_cubo(conn, nome, filtros)
+
+
+# Função para recortar um cubo pelos filtros nas suas dimensões (ANO por intervalo, as demais por lista)
+def fatiar(cubo, filtros):
+    fatiado = {'dimensoes': cubo['dimensoes'], 'rotulos': dict(cubo['rotulos']), 'periodo': cubo['periodo']}
+    fatiado.update({medida: cubo[medida] for medida in MEDIDAS_CUBO})
+    for coluna, valor in filtros:
+        eixo = cubo['dimensoes'].index(coluna)
+        rotulos = fatiado['rotulos'][coluna]
+        if coluna == 'ANO':
+            mascara = (rotulos >= valor[0]) & (rotulos <= valor[1])
+        else:
+            mascara = np.isin(rotulos, valor)
+        fatiado['rotulos'][coluna] = rotulos[mascara]
+        for medida in MEDIDAS_CUBO:
+            fatiado[medida] = np.compress(mascara, fatiado[medida], axis=eixo)
+    return fatiado
+
+
+# Função para obter um cubo com os filtros aplicados
+# Filtros só nas dimensões do cubo são resolvidos recortando o array gravado na carga; filtros em outras
+# colunas (ex.: SEXO no cubo temporal) montam um cubo a partir dos microdados, que fica em cache
+def obter_cubo(nome, filtros=None):
+    if nome not in CUBOS:
+        raise ValueError(f"Cubo desconhecido: {nome}")
+    filtros = normalizar_filtros(filtros)
+    versao = versao_conteudo()
+    if not {coluna for coluna, _ in filtros} <= set(CUBOS[nome]):
+        return _cubo_filtrado(versao, nome, filtros)
+    cubo = _cubo_gravado(versao, nome) if versao is not None else None
+    if cubo is None:
+        # Bancos ainda sem o cubo gravado (ou sem versão) montam o cubo completo uma vez por versão
+        cubo = _cubo_filtrado(versao, nome, ())
+    return fatiar(cubo, filtros)
+
+
+# Função para reduzir um cubo às dimensões pedidas (soma nos demais eixos) em formato longo
+# Todas as combinações são retornadas, inclusive as sem registros (valor zero)
+def reduzir(cubo, dimensoes, medida='TOTAL'):
+    if medida not in MEDIDAS_CUBO:
+        raise ValueError(f"Medida desconhecida: {medida}")
+    eixos = [cubo['dimensoes'].index(dimensao) for dimensao in dimensoes]
+    outros = tuple(eixo for eixo in range(len(cubo['dimensoes'])) if eixo not in eixos)
+    valores = cubo[medida].sum(axis=outros)
+    # Reordena os eixos restantes para a ordem pedida
+    valores = np.transpose(valores, np.argsort(np.argsort(eixos)))
+    indice = pd.MultiIndex.from_product([cubo['rotulos'][dimensao] for dimensao in dimensoes], names=dimensoes)
+    return pd.DataFrame({medida: valores.ravel()}, index=indice).reset_index()
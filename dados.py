@@ -0,0 +1,491 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from conexoes import CAMINHO_BANCO, leitura
+
+# Armazenamento usado na leitura dos microdados: 'sqlite' (padrão) ou 'parquet' (requer pyarrow)
+BACKEND = os.environ.get('VIOLENCIA_BACKEND', 'sqlite')
+
+TABELA = 'violencia_domestica'
+TABELA_RESUMO = 'resumo_violencia'
+TABELA_METADADOS = 'metadados'
+
+# Coluna com o hash de conteúdo de cada registro (usada para evitar duplicatas na carga incremental)
+COLUNA_HASH = 'HASH'
+
+# Cálculo da versão de conteúdo: incrementar ao mudar gravar_versao_conteudo (a versão é recalculada)
+FORMATO_VERSAO = 2
+
+# Dimensões do cubo pré-agregado usado pelos gráficos
+DIMENSOES_RESUMO = ['ANO', 'MUNICIPIO', 'REGIAO_GEOGRAFICA', 'NATUREZA', 'SEXO']
+
+# Colunas indexadas na tabela de microdados
+COLUNAS_INDEXADAS = ['ANO', 'MUNICIPIO', 'REGIAO_GEOGRAFICA', 'NATUREZA', 'SEXO', 'FAIXA_IDADE']
+
+# Colunas textuais com poucos valores distintos, carregadas como pandas Categorical
+COLUNAS_CATEGORICAS = ['MUNICIPIO', 'NATUREZA', 'SEXO', 'REGIAO_GEOGRAFICA', 'FAIXA_IDADE']
+
+# Colunas aceitas nos filtros: ANO por intervalo (inicio, fim), as demais por lista de valores
+COLUNAS_FILTRAVEIS = ['ANO', 'REGIAO_GEOGRAFICA', 'MUNICIPIO', 'NATUREZA', 'SEXO', 'FAIXA_IDADE']
+
+# Tipos inteiros compactos das colunas numéricas dos microdados (nullable quando houver nulos)
+TIPOS_INTEIROS = {'ANO': 'int16', 'TOTAL': 'int32'}
+
+# Expressões SQL de cada medida, na tabela de microdados e no cubo
+MEDIDAS = {
+    'TOTAL': {TABELA: 'SUM(TOTAL)', TABELA_RESUMO: 'SUM(TOTAL)'},
+    'CASOS': {TABELA: 'COUNT(*)', TABELA_RESUMO: 'SUM(CASOS)'},
+}
+
+# Cache compartilhado por todo o processo (todas as sessões e abas do Streamlit)
+# O lock global só protege o dicionário; cada leitura em andamento tem um lock próprio por chave,
+# de modo que uma consulta lenta não bloqueia as demais sessões
+_cache = {}
+_cache_lock = threading.Lock()
+_leituras = {}
+
+# Resultados filtrados (uma entrada por combinação de filtros) ficam em um LRU limitado
+MAXIMO_FILTRADOS = 128
+_filtrados = OrderedDict()
+
+
+# Função para executar uma consulta com uma conexão somente leitura do pool
+def get_data_from_sqlite(query, params=()):
+    with leitura() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+# Função para identificar a versão atual dos dados: a versão de conteúdo gravada pela carga (None sem banco)
+# Só a carga grava essa versão; escritas fora dela (previsões, seleção de modelos) não descartam o cache
+def versao_dados():
+    if not os.path.exists(CAMINHO_BANCO):
+        return None
+    try:
+        with leitura() as conn:
+            return ler_metadado(conn, 'versao_dados')
+    except sqlite3.OperationalError:
+        return None
+
+
+# Função para descartar o cache (chamada após recarregar o banco)
+def invalidar_cache():
+    with _cache_lock:
+        _cache.clear()
+        _filtrados.clear()
+        _leituras.clear()
+
+
+# Função para ajustar os tipos das colunas lidas do SQLite
+def _tipar(violencia_dm):
+    for coluna in ('ANO', 'TOTAL'):
+        if coluna in violencia_dm.columns:
+            violencia_dm[coluna] = pd.to_numeric(violencia_dm[coluna], errors='coerce')
+    return violencia_dm
+
+
+# Função para materializar o cubo ANO x MUNICIPIO x REGIAO x NATUREZA x SEXO
+# TOTAL soma os envolvidos e CASOS conta os registros de cada combinação
+def construir_resumo(conn):
+    dimensoes = ', '.join(DIMENSOES_RESUMO)
+    conn.execute(f"DROP TABLE IF EXISTS {TABELA_RESUMO}")
+    conn.execute(f"""
+        CREATE TABLE {TABELA_RESUMO} AS
+        SELECT {dimensoes}, SUM(TOTAL) AS TOTAL, COUNT(*) AS CASOS
+        FROM {TABELA}
+        GROUP BY {dimensoes}
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABELA_RESUMO}_ano ON {TABELA_RESUMO} (ANO)")
+
+
+# Função para recalcular no cubo apenas os anos que receberam novos registros
+def atualizar_resumo(conn, anos):
+    anos = set(anos)
+    if not anos:
+        return
+    dimensoes = ', '.join(DIMENSOES_RESUMO)
+    valores = sorted(ano for ano in anos if ano is not None)
+    marcadores = ', '.join('?' for _ in valores)
+    condicao = f"ANO IN ({marcadores})" if valores else "0"
+    if None in anos:
+        condicao += " OR ANO IS NULL"
+    conn.execute(f"DELETE FROM {TABELA_RESUMO} WHERE {condicao}", valores)
+    conn.execute(f"""
+        INSERT INTO {TABELA_RESUMO}
+        SELECT {dimensoes}, SUM(TOTAL) AS TOTAL, COUNT(*) AS CASOS
+        FROM {TABELA}
+        WHERE {condicao}
+        GROUP BY {dimensoes}
+    """, valores)
+
+
+# Função para calcular e gravar a versão de conteúdo dos dados (hash de todas as colunas dos microdados)
+# As linhas são percorridas pelo hash de cada registro, sem depender da ordem de carga: cargas que não
+# alteram os dados mantêm a mesma versão, preservando os caches derivados
+def gravar_versao_conteudo(conn):
+    colunas = sorted(colunas_dados(conn))
+    existentes = {linha[1] for linha in conn.execute(f"PRAGMA table_info({TABELA})")}
+    ordem = COLUNA_HASH if COLUNA_HASH in existentes else 'rowid'
+    selecao = ', '.join(f'"{coluna}"' for coluna in colunas)
+    resumo = hashlib.sha1(repr(colunas).encode('utf-8'))
+    cursor = conn.execute(f"SELECT {selecao} FROM {TABELA} ORDER BY {ordem}")
+    while True:
+        linhas = cursor.fetchmany(10000)
+        if not linhas:
+            break
+        resumo.update(''.join(repr(linha) + '\n' for linha in linhas).encode('utf-8'))
+    versao = resumo.hexdigest()[:16]
+    gravar_metadado(conn, 'versao_dados', versao)
+    gravar_metadado(conn, 'formato_versao', FORMATO_VERSAO)
+    return versao
+
+
+# Função para verificar se a versão de conteúdo gravada usa o cálculo atual
+# Bancos com a versão antiga (hash só do cubo pré-agregado) recalculam a versão na abertura
+def versao_atualizada(conn):
+    return ler_metadado(conn, 'formato_versao') == str(FORMATO_VERSAO)
+
+
+# Função para contar e gravar o número de registros dos microdados (a abertura do app lê o metadado)
+def gravar_registros(conn):
+    registros = conn.execute(f"SELECT COUNT(*) FROM {TABELA}").fetchone()[0]
+    gravar_metadado(conn, 'registros', registros)
+    return registros
+
+
+# Função para obter o número de registros gravado na última carga
+# Bancos anteriores ao metadado fazem a contagem uma única vez e passam a tê-lo (0 se a tabela não existir)
+def registros_banco(conn):
+    registros = ler_metadado(conn, 'registros')
+    if registros is not None:
+        return int(registros)
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABELA,)
+    ).fetchone()
+    if not existe:
+        return 0
+    registros = gravar_registros(conn)
+    conn.commit()
+    return registros
+
+
+# Função para ler um valor da tabela de metadados (None se não existir)
+def ler_metadado(conn, chave):
+    try:
+        linha = conn.execute(f"SELECT VALOR FROM {TABELA_METADADOS} WHERE CHAVE = ?", (chave,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return linha[0] if linha else None
+
+
+# Função para gravar um valor na tabela de metadados
+def gravar_metadado(conn, chave, valor):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_METADADOS} (CHAVE TEXT PRIMARY KEY, VALOR TEXT)")
+    conn.execute(
+        f"INSERT INTO {TABELA_METADADOS} (CHAVE, VALOR) VALUES (?, ?) "
+        "ON CONFLICT(CHAVE) DO UPDATE SET VALOR = excluded.VALOR",
+        (chave, None if valor is None else str(valor))
+    )
+
+
+# Função para listar as colunas de microdados da tabela (sem a coluna de hash)
+def colunas_dados(conn):
+    return [
+        linha[1] for linha in conn.execute(f"PRAGMA table_info({TABELA})")
+        if linha[1] != COLUNA_HASH
+    ]
+
+
+# Função para criar os índices usados pelas consultas agregadas
+def criar_indices(conn):
+    for coluna in COLUNAS_INDEXADAS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABELA}_{coluna.lower()} ON {TABELA} ({coluna})")
+
+
+# Função para calcular e gravar as estatísticas de cada coluna dos microdados (chamada na carga)
+# Uma única varredura da tabela calcula preenchidos, distintos, mínimo e máximo de todas as colunas
+def gravar_estatisticas(conn):
+    colunas = colunas_dados(conn)
+    tipos = {linha[1]: linha[2] for linha in conn.execute(f"PRAGMA table_info({TABELA})")}
+    expressoes = ', '.join(
+        f'COUNT("{coluna}"), COUNT(DISTINCT "{coluna}"), MIN("{coluna}"), MAX("{coluna}")' for coluna in colunas
+    )
+    linha = conn.execute(f"SELECT COUNT(*), {expressoes} FROM {TABELA}").fetchone()
+    registros = linha[0]
+    estatisticas = [
+        {
+            'COLUNA': coluna,
+            'TIPO': tipos[coluna],
+            'PREENCHIDOS': linha[1 + 4 * i],
+            'NULOS': registros - linha[1 + 4 * i],
+            'DISTINTOS': linha[2 + 4 * i],
+            'MINIMO': linha[3 + 4 * i],
+            'MAXIMO': linha[4 + 4 * i],
+        }
+        for i, coluna in enumerate(colunas)
+    ]
+    gravar_metadado(conn, 'estatisticas_colunas', json.dumps(estatisticas, ensure_ascii=False))
+    return estatisticas
+
+
+# Função para verificar se o cubo pré-agregado já existe no banco
+def resumo_existe(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABELA_RESUMO,)
+    ).fetchone() is not None
+
+
+# Função para buscar uma chave no cache da versão atual (chamada com _cache_lock adquirido)
+def _buscar(chave):
+    if chave in _cache:
+        return True, _cache[chave]
+    if chave in _filtrados:
+        _filtrados.move_to_end(chave)
+        return True, _filtrados[chave]
+    return False, None
+
+
+# Função para executar uma leitura uma única vez por versão do banco
+# Sessões que pedem a mesma chave durante a leitura aguardam o resultado dela; as demais seguem livres
+# Leituras filtradas entram no LRU limitado a MAXIMO_FILTRADOS; as demais ficam até a próxima versão
+# O DataFrame retornado é compartilhado entre as abas: não deve ser alterado in-place
+def _memorizar(chave, ler, filtrado=False):
+    versao = versao_dados()
+    with _cache_lock:
+        if _cache.get('versao') != versao:
+            _cache.clear()
+            _filtrados.clear()
+            _leituras.clear()
+            _cache['versao'] = versao
+        encontrado, valor = _buscar(chave)
+        if encontrado:
+            return valor
+        trava = _leituras.setdefault(chave, threading.Lock())
+
+    with trava:
+        with _cache_lock:
+            if _cache.get('versao') == versao:
+                encontrado, valor = _buscar(chave)
+                if encontrado:
+                    return valor
+        valor = ler()
+        with _cache_lock:
+            if _cache.get('versao') == versao:
+                if filtrado:
+                    _filtrados[chave] = valor
+                    while len(_filtrados) > MAXIMO_FILTRADOS:
+                        _filtrados.popitem(last=False)
+                else:
+                    _cache[chave] = valor
+            if _leituras.get(chave) is trava:
+                del _leituras[chave]
+    return valor
+
+
+# Função para ler uma consulta SQL uma única vez por versão do banco
+def _carregar(chave, query, params=(), filtrado=False):
+    return _memorizar(chave, lambda: _tipar(get_data_from_sqlite(query, params)), filtrado)
+
+
+# Função para ler uma consulta SQL qualquer com o mesmo cache por versão do banco
+# filtrado=True para consultas com filtros do usuário (entram no LRU limitado)
+def consulta_cacheada(chave, query, params=(), filtrado=False):
+    return _carregar(chave, query, params, filtrado)
+
+
+# Função para obter a versão de conteúdo dos dados gravada na última carga
+def versao_conteudo():
+    return versao_dados()
+
+
+# Função para obter o dicionário de categorias de cada coluna categórica
+# As categorias (valores distintos ordenados) são as mesmas para qualquer recorte dos dados
+def categorias():
+    def ler():
+        with leitura() as conn:
+            existentes = colunas_dados(conn)
+            return {
+                coluna: [
+                    linha[0] for linha in conn.execute(
+                        f"SELECT DISTINCT {coluna} FROM {TABELA} WHERE {coluna} IS NOT NULL ORDER BY {coluna}"
+                    )
+                ]
+                for coluna in COLUNAS_CATEGORICAS if coluna in existentes
+            }
+    return _memorizar('categorias', ler)
+
+
+# Função para obter o número de registros e as estatísticas das colunas gravados na última carga
+def metadados_tabela():
+    def ler():
+        with leitura() as conn:
+            registros = ler_metadado(conn, 'registros')
+            estatisticas = ler_metadado(conn, 'estatisticas_colunas')
+        if estatisticas is not None:
+            estatisticas = pd.DataFrame(json.loads(estatisticas))
+            # Mínimo e máximo misturam números e textos: exibidos como texto
+            for coluna in ('MINIMO', 'MAXIMO'):
+                estatisticas[coluna] = [None if valor is None else str(valor) for valor in estatisticas[coluna]]
+        return int(registros) if registros is not None else None, estatisticas
+    return _memorizar('metadados_tabela', ler)
+
+
+# Função para ler uma página dos microdados direto do SQLite (LIMIT/OFFSET)
+# Sem ordenação as páginas seguem a ordem de carga (rowid); com ordenação o índice da coluna é usado
+# quando existir e o rowid desempata, mantendo as páginas estáveis
+def pagina_dados(pagina=1, tamanho=10, ordenar_por=None, decrescente=False):
+    with leitura() as conn:
+        colunas = colunas_dados(conn)
+    if ordenar_por is not None and ordenar_por not in colunas:
+        raise ValueError(f"Coluna desconhecida: {ordenar_por}")
+    direcao = 'DESC' if decrescente else 'ASC'
+    ordem = f'"{ordenar_por}" {direcao}, rowid {direcao}' if ordenar_por else f"rowid {direcao}"
+    selecao = ', '.join(f'"{coluna}"' for coluna in colunas)
+    query = f"SELECT {selecao} FROM {TABELA} ORDER BY {ordem} LIMIT ? OFFSET ?"
+    return get_data_from_sqlite(query, (int(tamanho), (int(pagina) - 1) * int(tamanho)))
+
+
+# Função para converter os microdados para a representação compacta
+# ANO/TOTAL como inteiros pequenos, DATA_FATO como datetime e textos repetidos como Categorical
+def _compactar(violencia_dm):
+    for coluna, tipo in TIPOS_INTEIROS.items():
+        if coluna in violencia_dm.columns:
+            valores = pd.to_numeric(violencia_dm[coluna], errors='coerce')
+            violencia_dm[coluna] = valores.astype(tipo.capitalize() if valores.isna().any() else tipo)
+    if 'DATA_FATO' in violencia_dm.columns:
+        violencia_dm['DATA_FATO'] = pd.to_datetime(violencia_dm['DATA_FATO'], errors='coerce', format='ISO8601')
+    for coluna, valores in categorias().items():
+        if coluna in violencia_dm.columns:
+            violencia_dm[coluna] = pd.Categorical(violencia_dm[coluna], categories=valores)
+    return violencia_dm
+
+
+# Função para gerar o relatório de memória (bytes por coluna) de um DataFrame
+def relatorio_memoria(violencia_dm):
+    memoria = violencia_dm.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame({
+        'COLUNA': memoria.index,
+        'TIPO': [str(violencia_dm[coluna].dtype) for coluna in memoria.index],
+        'MEMORIA_KB': (memoria.values / 1024).round(1),
+    })
+    total = pd.DataFrame({'COLUNA': ['(todas)'], 'TIPO': [''], 'MEMORIA_KB': [round(memoria.sum() / 1024, 1)]})
+    return pd.concat([relatorio, total], ignore_index=True)
+
+
+# Função para carregar os microdados, opcionalmente apenas algumas colunas e anos
+# O DataFrame vem na representação compacta (inteiros pequenos, datas e categorias compartilhadas)
+# Com BACKEND='parquet' e o dataset em dia, lê o Parquet; caso contrário consulta o SQLite
+def load_data(colunas=None, anos=None):
+    colunas = list(colunas) if colunas is not None else None
+    anos = sorted(anos) if anos is not None else None
+    chave = ('dados', tuple(colunas) if colunas is not None else None, tuple(anos) if anos is not None else None)
+
+    if BACKEND == 'parquet':
+        import colunar
+        if colunar.pronto():
+            return _memorizar(chave, lambda: _compactar(colunar.ler_parquet(colunas, anos)))
+
+    if colunas is None:
+        with leitura() as conn:
+            colunas = colunas_dados(conn)
+    selecao = ', '.join(f'"{coluna}"' for coluna in colunas)
+    query = f"SELECT {selecao} FROM {TABELA}"
+    if anos is not None:
+        query += f" WHERE ANO IN ({', '.join('?' for _ in anos)})"
+    return _memorizar(chave, lambda: _compactar(get_data_from_sqlite(query, anos or ())))
+
+
+# Função para normalizar um dicionário de filtros em uma tupla ordenada (parte da chave do cache)
+# Filtros vazios ou None são descartados, de modo que "sem filtro" sempre gera a mesma chave
+# Aceita também uma tupla já normalizada
+def normalizar_filtros(filtros=None):
+    if not filtros:
+        return ()
+    filtros = dict(filtros)
+    desconhecidas = set(filtros) - set(COLUNAS_FILTRAVEIS)
+    if desconhecidas:
+        raise ValueError(f"Colunas não filtráveis: {sorted(desconhecidas)}")
+    normalizados = []
+    for coluna in COLUNAS_FILTRAVEIS:
+        valor = filtros.get(coluna)
+        if valor is None:
+            continue
+        if coluna == 'ANO':
+            inicio, fim = valor
+            normalizados.append((coluna, (int(inicio), int(fim))))
+        elif len(valor):
+            normalizados.append((coluna, tuple(sorted(set(valor)))))
+    return tuple(normalizados)
+
+
+# Função para compilar os filtros normalizados em condições SQL parametrizadas
+def condicoes_filtros(filtros):
+    condicoes, params = [], []
+    for coluna, valor in filtros:
+        if coluna == 'ANO':
+            condicoes.append("ANO BETWEEN ? AND ?")
+        else:
+            condicoes.append(f"{coluna} IN ({', '.join('?' for _ in valor)})")
+        params.extend(valor)
+    return condicoes, params
+
+
+# Função para agregar uma medida por um conjunto de colunas direto no SQLite
+# Usa o cubo pré-agregado quando ele cobre as colunas pedidas e as filtradas, e a tabela de microdados
+# (com índice em cada coluna filtrável) caso contrário; o resultado fica em cache por combinação de filtros
+def agregar(colunas, medida='TOTAL', filtros=None):
+    colunas = list(colunas)
+    if not colunas:
+        raise ValueError("Informe ao menos uma coluna para agregar")
+    if medida not in MEDIDAS:
+        raise ValueError(f"Medida desconhecida: {medida}")
+    if not set(colunas) <= set(COLUNAS_INDEXADAS):
+        raise ValueError(f"Colunas não agregáveis: {sorted(set(colunas) - set(COLUNAS_INDEXADAS))}")
+    filtros = normalizar_filtros(filtros)
+
+    envolvidas = set(colunas) | {coluna for coluna, _ in filtros}
+    tabela = TABELA_RESUMO if envolvidas <= set(DIMENSOES_RESUMO) else TABELA
+    selecao = ', '.join(colunas)
+    # Assim como o groupby do pandas, descarta grupos com chave nula
+    condicoes, params = condicoes_filtros(filtros)
+    filtro = ' AND '.join([f"{coluna} IS NOT NULL" for coluna in colunas] + condicoes)
+    query = f"""
+        SELECT {selecao}, {MEDIDAS[medida][tabela]} AS {medida}
+        FROM {tabela}
+        WHERE {filtro}
+        GROUP BY {selecao}
+        ORDER BY {selecao}
+    """
+    return _carregar(('agregado', tuple(colunas), medida, filtros), query, params, bool(filtros))
+
+
+# Função para somar TOTAL por período de DATA_FATO ('M' mensal ou 'D' diário), opcionalmente por uma coluna
+def serie_temporal(frequencia='M', coluna=None, filtros=None):
+    tamanhos = {'M': 7, 'D': 10}
+    if frequencia not in tamanhos:
+        raise ValueError(f"Frequência desconhecida: {frequencia}")
+    if coluna is not None and coluna not in COLUNAS_INDEXADAS:
+        raise ValueError(f"Coluna não agregável: {coluna}")
+    filtros = normalizar_filtros(filtros)
+
+    selecao = f"substr(DATA_FATO, 1, {tamanhos[frequencia]}) AS PERIODO"
+    agrupamento = "PERIODO"
+    condicoes, params = condicoes_filtros(filtros)
+    filtro = ' AND '.join(["DATA_FATO IS NOT NULL"] + condicoes)
+    if coluna is not None:
+        selecao += f", {coluna}"
+        agrupamento += f", {coluna}"
+        filtro += f" AND {coluna} IS NOT NULL"
+    query = f"""
+        SELECT {selecao}, SUM(TOTAL) AS TOTAL
+        FROM {TABELA}
+        WHERE {filtro}
+        GROUP BY {agrupamento}
+        ORDER BY {agrupamento}
+    """
+    return _carregar(('serie', frequencia, coluna, filtros), query, params, bool(filtros))
@@ -0,0 +1,55 @@
+import streamlit as st
+
+from dados import agregar, categorias
+
+# Rótulos dos filtros de valores exibidos na barra lateral
+ROTULOS_FILTROS = {
+    'REGIAO_GEOGRAFICA': 'Região geográfica',
+    'MUNICIPIO': 'Município',
+    'NATUREZA': 'Natureza do crime',
+    'SEXO': 'Sexo',
+    'FAIXA_IDADE': 'Faixa de idade',
+}
+
+
+# Função para listar os municípios disponíveis, restritos às regiões selecionadas (consulta ao cubo)
+def _municipios(regioes):
+    municipios = agregar(['REGIAO_GEOGRAFICA', 'MUNICIPIO'], medida='CASOS')
+    if regioes:
+        municipios = municipios[municipios['REGIAO_GEOGRAFICA'].isin(regioes)]
+    return sorted(municipios['MUNICIPIO'].unique())
+
+
+# Função para exibir os filtros na barra lateral e retornar o dicionário de filtros selecionados
+# O dicionário é aceito por dados.agregar/serie_temporal e pelas previsões
+def barra_filtros():
+    filtros = {}
+    valores = categorias()
+    anos = agregar(['ANO'], medida='CASOS')['ANO']
+
+    with st.sidebar.expander('Filtros', expanded=False):
+        if len(anos):
+            menor, maior = int(anos.min()), int(anos.max())
+            if menor < maior:
+                inicio, fim = st.slider('Anos:', menor, maior, (menor, maior), key='filtro_ANO')
+                if (inicio, fim) != (menor, maior):
+                    filtros['ANO'] = (inicio, fim)
+
+        for coluna, rotulo in ROTULOS_FILTROS.items():
+            if coluna == 'MUNICIPIO':
+                opcoes = _municipios(filtros.get('REGIAO_GEOGRAFICA'))
+            else:
+                opcoes = valores.get(coluna, [])
+            if not opcoes:
+                continue
+            chave = f'filtro_{coluna}'
+            # Seleções que deixaram de existir nas opções (ex.: após trocar a região) são descartadas
+            if chave in st.session_state:
+                st.session_state[chave] = [valor for valor in st.session_state[chave] if valor in opcoes]
+            selecionados = st.multiselect(f'{rotulo}:', opcoes, key=chave)
+            if selecionados:
+                filtros[coluna] = selecionados
+
+    if filtros:
+        st.sidebar.caption(f"{len(filtros)} filtro(s) aplicado(s)")
+    return filtros
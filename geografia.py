@@ -0,0 +1,186 @@
+import json
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+from dados import TABELA, consulta_cacheada
+
+ARQUIVO_GEOJSON = 'pernambuco_municipios.json'
+TABELA_MUNICIPIOS = 'municipios_ibge'
+
+# Grafias alternativas de municípios (já normalizadas) -> nome normalizado usado no GeoJSON
+APELIDOS_MUNICIPIOS = {
+    'IGUARACY': 'IGUARACI',
+    'LAGOA DE ITAENGA': 'LAGOA DO ITAENGA',
+    'BELEM DO SAO FRANCISCO': 'BELEM DE SAO FRANCISCO',
+    'SAO CAETANO': 'SAO CAITANO',
+    'SANTA TERESINHA': 'SANTA TEREZINHA',
+    'ITAMARACA': 'ILHA DE ITAMARACA',
+    'JABOATAO': 'JABOATAO DOS GUARARAPES',
+}
+
+# Preposições ignoradas na comparação de segunda tentativa
+PREPOSICOES = {'DE', 'DA', 'DO', 'DAS', 'DOS', 'E'}
+
+# Tolerância da simplificação (em graus) e casas decimais mantidas nas coordenadas
+# 0.001 grau equivale a pouco mais de 100 m na latitude de Pernambuco
+TOLERANCIA_PADRAO = 0.002
+CASAS_DECIMAIS = 4
+
+# Níveis de detalhe oferecidos no mapa
+NIVEIS_DETALHE = {
+    'Alto': 0.0005,
+    'Médio': TOLERANCIA_PADRAO,
+    'Baixo': 0.005,
+}
+
+
+# Função para carregar o GeoJSON original uma única vez por processo
+@lru_cache(maxsize=1)
+def carregar_geojson(caminho=ARQUIVO_GEOJSON):
+    with open(caminho, 'r') as file:
+        return json.load(file)
+
+
+# Função para simplificar uma linha pelo algoritmo de Douglas-Peucker (retorna os índices mantidos)
+def _douglas_peucker(pontos, tolerancia):
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, len(pontos) - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+        a, b = pontos[inicio], pontos[fim]
+        meio = pontos[inicio + 1:fim]
+        direcao = b - a
+        comprimento = np.hypot(*direcao)
+        if comprimento == 0:
+            distancias = np.hypot(*(meio - a).T)
+        else:
+            distancias = np.abs(direcao[0] * (meio[:, 1] - a[1]) - direcao[1] * (meio[:, 0] - a[0])) / comprimento
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia:
+            indice = inicio + 1 + maior
+            manter[indice] = True
+            pilha.append((inicio, indice))
+            pilha.append((indice, fim))
+    return manter
+
+
+# Função para simplificar um anel do polígono mantendo-o fechado e com ao menos 4 pontos
+def simplificar_anel(anel, tolerancia, casas=CASAS_DECIMAIS):
+    pontos = np.asarray(anel, dtype=float)
+    if tolerancia > 0 and len(pontos) > 4:
+        # O anel é dividido no ponto mais distante do início para que a simplificação não o colapse
+        oposto = int(np.argmax(np.hypot(*(pontos - pontos[0]).T)))
+        manter = np.concatenate([
+            _douglas_peucker(pontos[:oposto + 1], tolerancia)[:-1],
+            _douglas_peucker(pontos[oposto:], tolerancia),
+        ])
+        simplificado = pontos[manter]
+        if len(simplificado) < 4:
+            terco = len(pontos) // 3
+            simplificado = pontos[[0, terco, 2 * terco, 0]]
+        pontos = simplificado
+
+    pontos = np.round(pontos, casas)
+    # Remove pontos consecutivos que ficaram iguais após o arredondamento
+    distintos = np.concatenate([[True], np.any(np.diff(pontos, axis=0) != 0, axis=1)])
+    pontos = pontos[distintos]
+    if len(pontos) < 4:
+        pontos = np.round(np.asarray(anel, dtype=float), casas)
+    return pontos.tolist()
+
+
+# Função para gerar o GeoJSON simplificado, com cada feição identificada pelo código IBGE (properties.id)
+# O resultado fica em cache por combinação de tolerância e precisão
+@lru_cache(maxsize=8)
+def geojson_simplificado(tolerancia=TOLERANCIA_PADRAO, casas=CASAS_DECIMAIS):
+    original = carregar_geojson()
+    features = []
+    for feature in original['features']:
+        geometria = feature['geometry']
+        if geometria['type'] == 'Polygon':
+            coordenadas = [simplificar_anel(anel, tolerancia, casas) for anel in geometria['coordinates']]
+        else:
+            coordenadas = [
+                [simplificar_anel(anel, tolerancia, casas) for anel in poligono]
+                for poligono in geometria['coordinates']
+            ]
+        features.append({
+            'type': 'Feature',
+            'id': int(feature['properties']['id']),
+            'properties': feature['properties'],
+            'geometry': {'type': geometria['type'], 'coordinates': coordenadas},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+# Função para normalizar nomes de municípios: sem acentos, maiúsculas e espaços simples
+def normalizar_nome(nome):
+    if nome is None:
+        return ''
+    texto = unicodedata.normalize('NFKD', str(nome))
+    texto = ''.join(caractere for caractere in texto if not unicodedata.combining(caractere))
+    texto = re.sub(r"[^A-Za-z0-9]+", ' ', texto).strip().upper()
+    return APELIDOS_MUNICIPIOS.get(texto, texto)
+
+
+# Função para a chave de segunda tentativa (nome normalizado sem preposições)
+def _sem_preposicoes(nome_normalizado):
+    return ' '.join(palavra for palavra in nome_normalizado.split() if palavra not in PREPOSICOES)
+
+
+# Função para obter o índice nome normalizado -> código IBGE (properties.name e properties.description)
+@lru_cache(maxsize=1)
+def ids_por_nome():
+    indice = {}
+    for feature in carregar_geojson()['features']:
+        propriedades = feature['properties']
+        for nome in (propriedades['name'], propriedades.get('description')):
+            chave = normalizar_nome(nome)
+            if chave:
+                indice.setdefault(chave, int(propriedades['id']))
+                indice.setdefault(_sem_preposicoes(chave), int(propriedades['id']))
+    return indice
+
+
+# Função para encontrar o código IBGE de um nome de município (None se não houver correspondência)
+def id_municipio(nome):
+    indice = ids_por_nome()
+    chave = normalizar_nome(nome)
+    return indice.get(chave, indice.get(_sem_preposicoes(chave)))
+
+
+# Função para gravar no banco a correspondência MUNICIPIO -> código IBGE (chamada na carga)
+# Retorna a lista de nomes sem correspondência no GeoJSON
+def construir_indice_municipios(conn):
+    conn.execute(f"DROP TABLE IF EXISTS {TABELA_MUNICIPIOS}")
+    conn.execute(f"CREATE TABLE {TABELA_MUNICIPIOS} (MUNICIPIO TEXT PRIMARY KEY, ID_IBGE INTEGER)")
+    nomes = [
+        linha[0] for linha in conn.execute(f"SELECT DISTINCT MUNICIPIO FROM {TABELA} WHERE MUNICIPIO IS NOT NULL")
+    ]
+    correspondencias = [(nome, id_municipio(nome)) for nome in nomes]
+    conn.executemany(f"INSERT INTO {TABELA_MUNICIPIOS} VALUES (?, ?)", correspondencias)
+    return sorted(nome for nome, codigo in correspondencias if codigo is None)
+
+
+# Função para verificar se a tabela de correspondência de municípios existe
+def indice_municipios_existe(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABELA_MUNICIPIOS,)
+    ).fetchone() is not None
+
+
+# Função para carregar a correspondência MUNICIPIO -> ID_IBGE gravada no banco
+def municipios_ibge():
+    return consulta_cacheada('municipios_ibge', f"SELECT MUNICIPIO, ID_IBGE FROM {TABELA_MUNICIPIOS}")
+
+
+# Função para listar os municípios dos microdados sem correspondência no GeoJSON
+def municipios_sem_correspondencia():
+    municipios = municipios_ibge()
+    return municipios.loc[municipios['ID_IBGE'].isna(), 'MUNICIPIO'].tolist()
@@ -0,0 +1,358 @@
+import datetime
+import glob
+import hashlib
+import os
+import threading
+
+import colunar
+import dados
+from cubos import gravar_cubos
+from dados import (
+    COLUNA_HASH, TABELA, atualizar_resumo, colunas_dados, construir_resumo, criar_indices,
+    gravar_estatisticas, gravar_metadado, gravar_registros, gravar_versao_conteudo, ler_metadado
+)
+from geografia import construir_indice_municipios
+from previsoes import precomputar_previsoes
+from selecao_modelos import atualizar_selecao
+
+ARQUIVO_EXCEL = 'MICRODADOS_DE_VIOLÊNCIA_DOMÉSTICA_JAN_2015_A_AGO_2024.xlsx'
+
+# Nomes das colunas da planilha renomeados para o banco
+RENOMEAR_COLUNAS = {
+    'MUNICÍPIO DO FATO': 'MUNICIPIO',
+    'REGIAO GEOGRÁFICA': 'REGIAO_GEOGRAFICA',
+    'DATA DO FATO': 'DATA_FATO',
+    'IDADE SENASP': 'FAIXA_IDADE',
+    'TOTAL DE ENVOLVIDOS': 'TOTAL'
+}
+
+# Tipos explícitos das colunas conhecidas (as demais são gravadas como TEXT)
+TIPOS_COLUNAS = {
+    'ANO': 'INTEGER',
+    'TOTAL': 'INTEGER',
+    'DATA_FATO': 'TEXT',
+}
+
+# Padrão dos nomes das planilhas publicadas (uma por release mensal)
+PADRAO_PLANILHAS = 'MICRODADOS_DE_VIOLÊNCIA_DOMÉSTICA_*.xlsx'
+
+TAMANHO_LOTE = 5000
+
+# Assinatura da planilha cuja carga já foi verificada neste processo (None enquanto não houver verificação)
+# Evita repetir a checagem do banco a cada rerun do Streamlit
+_verificada = {'assinatura': None}
+_verificada_lock = threading.Lock()
+
+
+# Função para converter valores numéricos da planilha
+def _inteiro(valor):
+    if valor is None or valor == '':
+        return None
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return None
+
+
+# Função para converter a data do fato para o formato ISO (AAAA-MM-DD)
+def _data(valor):
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.strftime('%Y-%m-%d')
+    texto = str(valor).strip()
+    for formato in ('%d/%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return texto
+
+
+# Função para normalizar textos (remove espaços extras e converte vazios em nulo)
+def _texto(valor):
+    if valor is None:
+        return None
+    texto = str(valor).strip()
+    return texto or None
+
+
+CONVERSORES = {
+    'INTEGER': _inteiro,
+    'TEXT': _texto,
+}
+
+
+# Função para montar os conversores de cada coluna do cabeçalho
+def _conversores(colunas):
+    conversores = []
+    for coluna in colunas:
+        if coluna == 'DATA_FATO':
+            conversores.append(_data)
+        else:
+            conversores.append(CONVERSORES[TIPOS_COLUNAS.get(coluna, 'TEXT')])
+    return conversores
+
+
+# Função para ler a planilha linha a linha, sem carregar o arquivo inteiro em memória
+# Retorna as colunas renomeadas, o total estimado de linhas e um iterador de linhas já tipadas
+def ler_excel(caminho):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(caminho, read_only=True, data_only=True)
+    planilha = workbook.active
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = next(linhas)
+    colunas = [RENOMEAR_COLUNAS.get(str(nome).strip(), str(nome).strip()) for nome in cabecalho]
+    conversores = _conversores(colunas)
+    total_linhas = (planilha.max_row - 1) if planilha.max_row else None
+
+    def gerar():
+        try:
+            for linha in linhas:
+                if linha is None or all(valor is None for valor in linha):
+                    continue
+                yield tuple(converter(valor) for converter, valor in zip(conversores, linha))
+        finally:
+            workbook.close()
+
+    return colunas, total_linhas, gerar()
+
+
+# Tabela de preparo da carga: recebe as linhas da planilha com a chave de conteúdo antes do hash final
+TABELA_PREPARO = 'carga_preparo'
+
+
+# Função para acrescentar a chave de conteúdo (SHA-1 dos pares coluna=valor, em ordem de coluna) a cada linha
+def _com_chave(colunas, linhas):
+    ordem = sorted(range(len(colunas)), key=lambda i: colunas[i])
+    for linha in linhas:
+        conteudo = '\x1f'.join(f"{colunas[i]}={'' if linha[i] is None else linha[i]}" for i in ordem)
+        yield linha + (hashlib.sha1(conteudo.encode('utf-8')).digest(),)
+
+
+# Função para gerar o hash de um registro a partir da chave de conteúdo e do número da ocorrência
+# Linhas idênticas dentro do mesmo arquivo recebem hashes distintos pelo número da ocorrência,
+# de modo que registros repetidos legítimos são preservados e uma nova carga do mesmo arquivo não duplica nada
+def _hash_ocorrencia(chave, ocorrencia):
+    return hashlib.sha1(bytes(chave) + str(ocorrencia).encode()).hexdigest()
+
+
+# Função para gerar a assinatura (tamanho e data de modificação) do arquivo de origem
+def assinatura_arquivo(caminho):
+    estado = os.stat(caminho)
+    return f"{estado.st_size}:{estado.st_mtime_ns}"
+
+
+# Função para ajustar o banco para escrita em lote
+# Alterações pendentes (ex.: metadados gravados na verificação do banco) são confirmadas antes, pois o
+# SQLite não aceita mudar o synchronous dentro de uma transação aberta
+def configurar_escrita(conn):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    # Ordenações temporárias (índices, numeração das ocorrências) vão para arquivo, não para a memória
+    conn.execute("PRAGMA temp_store=FILE")
+    conn.execute("PRAGMA cache_size=-65536")
+
+
+# Função para gravar os microdados em lotes dentro de uma única transação
+# progresso(linhas_gravadas, total_linhas) é chamado a cada lote
+# Qualquer interrupção desfaz a transação, inclusive as exceções de rerun e stop do Streamlit (BaseException),
+# que podem sair do progresso; só então o synchronous pode voltar ao normal
+def gravar_linhas(conn, colunas, linhas, total_linhas=None, tamanho_lote=TAMANHO_LOTE, progresso=None,
+                  assinatura=None):
+    definicao = ', '.join(f'"{coluna}" {TIPOS_COLUNAS.get(coluna, "TEXT")}' for coluna in colunas)
+
+    configurar_escrita(conn)
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"DROP TABLE IF EXISTS {TABELA}")
+        conn.execute(f"CREATE TABLE {TABELA} ({definicao}, {COLUNA_HASH} TEXT)")
+        conn.execute(f"CREATE UNIQUE INDEX idx_{TABELA}_hash ON {TABELA} ({COLUNA_HASH})")
+
+        lidas = _inserir_lotes(conn, colunas, linhas, total_linhas, tamanho_lote, progresso)
+
+        criar_indices(conn)
+        construir_resumo(conn)
+        construir_indice_municipios(conn)
+        gravar_versao_conteudo(conn)
+        gravar_registros(conn)
+        gravar_estatisticas(conn)
+        gravar_cubos(conn)
+        gravar_metadado(conn, 'arquivo_excel', assinatura)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return lidas
+
+
+# Função para inserir as linhas (com hash) em lotes; hashes já existentes são ignorados
+# As linhas passam antes pela tabela de preparo, onde o SQLite numera as ocorrências de cada chave
+# (ROW_NUMBER por chave, na ordem da planilha): a memória da carga não cresce com o tamanho do arquivo
+def _inserir_lotes(conn, colunas, linhas, total_linhas, tamanho_lote, progresso):
+    nomes = ', '.join(f'"{coluna}"' for coluna in colunas)
+    conn.execute(f"DROP TABLE IF EXISTS {TABELA_PREPARO}")
+    conn.execute(f"CREATE TABLE {TABELA_PREPARO} ({nomes}, CHAVE BLOB)")
+    marcadores = ', '.join('?' for _ in range(len(colunas) + 1))
+    insert = f"INSERT INTO {TABELA_PREPARO} VALUES ({marcadores})"
+
+    lidas = 0
+    lote = []
+    for linha in _com_chave(colunas, linhas):
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            conn.executemany(insert, lote)
+            lidas += len(lote)
+            lote = []
+            if progresso:
+                progresso(lidas, total_linhas)
+    if lote:
+        conn.executemany(insert, lote)
+        lidas += len(lote)
+
+    # O índice por chave entrega as linhas de cada chave em ordem de rowid, sem ordenar a tabela inteira
+    conn.execute(f"CREATE INDEX idx_{TABELA_PREPARO}_chave ON {TABELA_PREPARO} (CHAVE)")
+    conn.create_function('hash_ocorrencia', 2, _hash_ocorrencia, deterministic=True)
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {TABELA} ({nomes}, {COLUNA_HASH})
+        SELECT {nomes}, hash_ocorrencia(CHAVE, OCORRENCIA)
+        FROM (
+            SELECT rowid AS ORDEM, *, ROW_NUMBER() OVER (PARTITION BY CHAVE ORDER BY rowid) - 1 AS OCORRENCIA
+            FROM {TABELA_PREPARO}
+        )
+        ORDER BY ORDEM
+    """)
+    conn.execute(f"DROP TABLE {TABELA_PREPARO}")
+    if progresso:
+        progresso(lidas, total_linhas)
+    return lidas
+
+
+# Função para acrescentar apenas os registros novos de uma planilha mais recente
+# Períodos (AAAA-MM de DATA_FATO) anteriores ao último já carregado são descartados sem consulta ao banco;
+# o último período e os seguintes passam pelo hash de conteúdo, que ignora linhas já gravadas
+# Retorna o número de registros novos gravados e os anos afetados
+def acrescentar_linhas(conn, colunas, linhas, total_linhas=None, tamanho_lote=TAMANHO_LOTE, progresso=None,
+                       assinatura=None):
+    configurar_escrita(conn)
+    try:
+        conn.execute("BEGIN")
+        existentes = colunas_dados(conn)
+        for coluna in colunas:
+            if coluna not in existentes:
+                conn.execute(f'ALTER TABLE {TABELA} ADD COLUMN "{coluna}" {TIPOS_COLUNAS.get(coluna, "TEXT")}')
+
+        periodos = {
+            linha[0] for linha in
+            conn.execute(f"SELECT DISTINCT substr(DATA_FATO, 1, 7) FROM {TABELA} WHERE DATA_FATO IS NOT NULL")
+        }
+        ultimo_periodo = max(periodos) if periodos else None
+        ultimo_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {TABELA}").fetchone()[0]
+
+        if 'DATA_FATO' in colunas and ultimo_periodo:
+            posicao = colunas.index('DATA_FATO')
+
+            def novas(linhas):
+                for linha in linhas:
+                    data = linha[posicao]
+                    if data is not None and data[:7] in periodos and data[:7] < ultimo_periodo:
+                        continue
+                    yield linha
+
+            linhas = novas(linhas)
+
+        _inserir_lotes(conn, colunas, linhas, total_linhas, tamanho_lote, progresso)
+        criar_indices(conn)
+
+        anos = {
+            linha[0] for linha in
+            conn.execute(f"SELECT DISTINCT ANO FROM {TABELA} WHERE rowid > ?", (ultimo_rowid,))
+        }
+        novos = conn.execute(f"SELECT COUNT(*) FROM {TABELA} WHERE rowid > ?", (ultimo_rowid,)).fetchone()[0]
+        atualizar_resumo(conn, anos)
+        construir_indice_municipios(conn)
+        gravar_versao_conteudo(conn)
+        gravar_registros(conn)
+        gravar_estatisticas(conn)
+        gravar_cubos(conn)
+        gravar_metadado(conn, 'arquivo_excel', assinatura)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return novos, anos
+
+
+# Função para verificar se o dataset Parquet opcional deve ser mantido junto com o banco
+def usa_parquet():
+    return dados.BACKEND == 'parquet' and colunar.disponivel()
+
+
+# Função para carregar a planilha de microdados no banco SQLite
+def ingerir_excel(conn, caminho=ARQUIVO_EXCEL, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    colunas, total_linhas, linhas = ler_excel(caminho)
+    lidas = gravar_linhas(conn, colunas, linhas, total_linhas, tamanho_lote, progresso,
+                          assinatura=assinatura_arquivo(caminho))
+    if usa_parquet():
+        colunar.exportar_parquet(conn)
+    precomputar_previsoes(conn)
+    atualizar_selecao(conn)
+    return lidas
+
+
+# Função para localizar a planilha mais recente disponível (a padrão se nenhuma for encontrada)
+def planilha_mais_recente():
+    planilhas = glob.glob(PADRAO_PLANILHAS)
+    if not planilhas:
+        return ARQUIVO_EXCEL
+    return max(planilhas, key=os.path.getmtime)
+
+
+# Função para verificar se o banco aceita carga incremental (tabela gravada com a coluna de hash)
+def suporta_incremental(conn):
+    return any(linha[1] == COLUNA_HASH for linha in conn.execute(f"PRAGMA table_info({TABELA})"))
+
+
+# Função para verificar se a planilha mudou desde a última carga
+def planilha_alterada(conn, caminho=ARQUIVO_EXCEL):
+    if not os.path.exists(caminho):
+        return False
+    return ler_metadado(conn, 'arquivo_excel') != assinatura_arquivo(caminho)
+
+
+# Função para obter a assinatura da planilha ('' se ela não existir)
+def assinatura_planilha(caminho):
+    return assinatura_arquivo(caminho) if os.path.exists(caminho) else ''
+
+
+# Função para verificar se o banco já foi conferido neste processo para a planilha informada
+def banco_verificado(caminho):
+    with _verificada_lock:
+        return _verificada['assinatura'] == assinatura_planilha(caminho)
+
+
+# Função para registrar que o banco está pronto para a planilha informada
+def marcar_verificado(caminho):
+    with _verificada_lock:
+        _verificada['assinatura'] = assinatura_planilha(caminho)
+
+
+# Função para acrescentar ao banco apenas os registros novos da planilha
+def atualizar_excel(conn, caminho=ARQUIVO_EXCEL, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    # Se o Parquet estava em dia com a carga anterior, só os anos com registros novos são regravados
+    parquet_em_dia = usa_parquet() and colunar.atualizado(conn)
+    colunas, total_linhas, linhas = ler_excel(caminho)
+    novos, anos = acrescentar_linhas(conn, colunas, linhas, total_linhas, tamanho_lote, progresso,
+                                     assinatura=assinatura_arquivo(caminho))
+    if usa_parquet():
+        colunar.exportar_parquet(conn, anos=anos if parquet_em_dia else None)
+    precomputar_previsoes(conn)
+    atualizar_selecao(conn)
+    return novos
@@ -0,0 +1,152 @@
+import datetime
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Arquivo JSON Lines opcional onde cada etapa medida é acrescentada (ex.: para coleta em produção)
+ARQUIVO_METRICAS = os.environ.get('VIOLENCIA_METRICAS')
+
+# Etapas mantidas em memória para o painel e a exportação (as mais antigas são descartadas)
+MAXIMO_REGISTROS = 5000
+
+logger = logging.getLogger('violencia.metricas')
+
+# Registros recentes de todo o processo e a execução (rerun) em andamento de cada thread
+_registros = deque(maxlen=MAXIMO_REGISTROS)
+_registros_lock = threading.Lock()
+_execucoes = itertools.count(1)
+_atual = threading.local()
+
+
+# Função para ler a memória residente do processo em bytes
+# Usa o psutil quando instalado e, sem ele, o /proc do Linux (None se nenhum estiver disponível)
+def _memoria():
+    try:
+        import psutil
+    except ImportError:
+        try:
+            with open('/proc/self/statm') as arquivo:
+                return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+    return psutil.Process().memory_info().rss
+
+
+# Função para iniciar a medição de uma execução do app (chamada no início de cada rerun)
+def iniciar_execucao(visao=None):
+    _atual.execucao = next(_execucoes)
+    _atual.etapas = []
+    definir_visao(visao)
+
+
+# Função para identificar a visão medida a partir daqui (a próxima etapa começa a contar agora)
+def definir_visao(visao):
+    _atual.visao = visao
+    _atual.inicio = time.perf_counter()
+    _atual.memoria = _memoria()
+
+
+# Função para listar as etapas medidas na execução em andamento desta thread
+def etapas_execucao():
+    return list(getattr(_atual, 'etapas', []))
+
+
+# Função para gravar uma etapa medida (memória, log estruturado e arquivo opcional)
+def _registrar(nome, segundos, memoria_inicial, resultado=None):
+    memoria = _memoria()
+    registro = {
+        'horario': datetime.datetime.now().isoformat(timespec='milliseconds'),
+        'execucao': getattr(_atual, 'execucao', None),
+        'visao': getattr(_atual, 'visao', None),
+        'etapa': nome,
+        'linhas': len(resultado) if hasattr(resultado, '__len__') else None,
+        'segundos': round(segundos, 6),
+        'memoria_kb': round((memoria - memoria_inicial) / 1024, 1) if memoria_inicial is not None else None,
+    }
+    with _registros_lock:
+        _registros.append(registro)
+    if hasattr(_atual, 'etapas'):
+        _atual.etapas.append(registro)
+    linha = json.dumps(registro, ensure_ascii=False, default=str)
+    logger.debug(linha)
+    if ARQUIVO_METRICAS:
+        with open(ARQUIVO_METRICAS, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha + '\n')
+    return registro
+
+
+# Função para encerrar uma etapa da execução: mede o tempo e a memória desde a marca anterior
+# (ou desde iniciar_execucao) e, se informado, o número de linhas do resultado da etapa
+def marcar(nome, resultado=None):
+    agora = time.perf_counter()
+    inicio = getattr(_atual, 'inicio', agora)
+    registro = _registrar(nome, agora - inicio, getattr(_atual, 'memoria', None), resultado)
+    _atual.inicio = time.perf_counter()
+    _atual.memoria = _memoria()
+    return registro
+
+
+# Gerenciador de contexto que mede um bloco isolado (ex.: a verificação do banco na abertura do app)
+@contextmanager
+def etapa(nome):
+    memoria = _memoria()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar(nome, time.perf_counter() - inicio, memoria)
+
+
+# Função para obter os registros recentes do processo como DataFrame
+def registros():
+    with _registros_lock:
+        return pd.DataFrame(list(_registros), columns=[
+            'horario', 'execucao', 'visao', 'etapa', 'linhas', 'segundos', 'memoria_kb'
+        ])
+
+
+# Função para resumir o tempo de cada etapa por visão (execuções, média, p95 e máximo)
+def resumo_metricas():
+    dados = registros()
+    if dados.empty:
+        return pd.DataFrame(columns=['visao', 'etapa', 'execucoes', 'media_s', 'p95_s', 'maximo_s'])
+    return (
+        dados.groupby(['visao', 'etapa'], dropna=False, sort=False)['segundos']
+        .agg(execucoes='count', media_s='mean', p95_s=lambda tempos: tempos.quantile(0.95), maximo_s='max')
+        .round(4)
+        .reset_index()
+    )
+
+
+# Função para exportar os registros recentes no formato JSON Lines
+def exportar_metricas():
+    with _registros_lock:
+        return ''.join(json.dumps(registro, ensure_ascii=False, default=str) + '\n' for registro in _registros)
+
+
+# Função para exibir o painel de depuração opcional na barra lateral (chamada ao fim do script)
+def painel_depuracao():
+    import streamlit as st
+
+    if not st.sidebar.checkbox('Modo de depuração', key='depuracao'):
+        return
+    with st.sidebar.expander('Desempenho desta execução', expanded=True):
+        etapas = pd.DataFrame(etapas_execucao())
+        if etapas.empty:
+            st.caption('Nenhuma etapa medida nesta execução.')
+        else:
+            st.dataframe(etapas[['etapa', 'segundos', 'linhas', 'memoria_kb']], hide_index=True)
+            st.caption(f"Total: {etapas['segundos'].sum():.3f} s")
+    with st.sidebar.expander('Desempenho acumulado do processo'):
+        st.dataframe(resumo_metricas(), hide_index=True)
+        st.download_button(
+            'Exportar métricas (JSON Lines)', exportar_metricas(), file_name='metricas.jsonl',
+            mime='application/x-ndjson'
+        )
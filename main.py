@@ -1,57 +1,114 @@
-import pandas as pd
-import sqlite3
 import streamlit as st
-from visualizacao import *
-from predicao import *
-from about import *
-
-# Função para criar conexões temporárias
-def get_data_from_sqlite(query):
-    with sqlite3.connect('violencia_dm.db', check_same_thread=False) as conn:
-        return pd.read_sql_query(query, conn)
+from conexoes import escrita
+from cubos import cubos_atualizados, gravar_cubos
+from instrumentacao import etapa, iniciar_execucao, painel_depuracao
+from dados import (
+    construir_resumo, criar_indices, gravar_estatisticas, gravar_versao_conteudo, invalidar_cache, ler_metadado,
+    registros_banco, resumo_existe, versao_atualizada
+)
+from geografia import construir_indice_municipios, indice_municipios_existe
+from previsoes import precomputar_previsoes
+from selecao_modelos import atualizar_selecao, selecao_atualizada
+from ingestao import (
+    atualizar_excel, banco_verificado, ingerir_excel, marcar_verificado, planilha_alterada, planilha_mais_recente,
+    suporta_incremental
+)
 
 # Função para tratamento de dados
+# A verificação roda uma vez por processo (e de novo só quando surgir uma planilha diferente);
+# nos demais reruns custa apenas a busca da planilha
 def tratamento_data():
-    conn = sqlite3.connect('violencia_dm.db', check_same_thread=False)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            SELECT name FROM sqlite_master WHERE type='table' AND name='violencia_domestica';
-        """)
-        tabela_existe = cursor.fetchone()
-
-        if tabela_existe:
-            cursor.execute("SELECT COUNT(*) FROM violencia_domestica;")
-            registros = cursor.fetchone()[0]
-            if registros > 0:
+    planilha = planilha_mais_recente()
+    if banco_verificado(planilha):
+        return
+    # A verificação e a carga usam a conexão de escrita única do processo
+    with escrita() as conn:
+        # Outra sessão pode ter concluído a verificação enquanto esta aguardava a conexão
+        if banco_verificado(planilha):
+            return
+
+        # Número de registros lido da tabela de metadados (gravado na carga)
+        if registros_banco(conn) > 0:
+            # Bancos criados antes do cubo pré-agregado ganham o resumo aqui
+            if not resumo_existe(conn):
+                criar_indices(conn)
+                construir_resumo(conn)
+                conn.commit()
+                invalidar_cache()
+            # Bancos sem a correspondência de municípios com o GeoJSON ganham o índice aqui
+            if not indice_municipios_existe(conn):
+                construir_indice_municipios(conn)
+                conn.commit()
+                invalidar_cache()
+            # Bancos sem versão de conteúdo (ou com o cálculo antigo) ganham a versão e as previsões
+            if not versao_atualizada(conn):
+                gravar_versao_conteudo(conn)
+                conn.commit()
+                invalidar_cache()
+                precomputar_previsoes(conn)
+            # Bancos sem as estatísticas das colunas (exibidas no About) ganham as estatísticas aqui
+            if ler_metadado(conn, 'estatisticas_colunas') is None:
+                gravar_estatisticas(conn)
+                conn.commit()
+                invalidar_cache()
+            # Bancos sem os cubos de contagem da versão atual (mês, dia da semana, faixa etária) ganham os cubos aqui
+            if not cubos_atualizados(conn):
+                gravar_cubos(conn)
+                conn.commit()
+            # Bancos sem a seleção de modelos da versão atual ganham a seleção aqui
+            if not selecao_atualizada(conn):
+                with st.spinner("Selecionando os modelos de previsão de cada série..."):
+                    atualizar_selecao(conn)
+
+            if not planilha_alterada(conn, planilha):
+                marcar_verificado(planilha)
                 st.info("Os dados já estão salvos no banco SQLite. Pulando carregamento do Excel.")
                 return
 
-        violencia_dm = pd.read_excel('MICRODADOS_DE_VIOLÊNCIA_DOMÉSTICA_JAN_2015_A_AGO_2024.xlsx')
-        violencia_dm = violencia_dm.rename(columns={
-            'MUNICÍPIO DO FATO': 'MUNICIPIO',
-            'REGIAO GEOGRÁFICA': 'REGIAO_GEOGRAFICA',
-            'DATA DO FATO': 'DATA_FATO',
-            'IDADE SENASP': 'FAIXA_IDADE',
-            'TOTAL DE ENVOLVIDOS': 'TOTAL'
-        })
-        violencia_dm.to_sql('violencia_domestica', conn, if_exists='replace', index=False)
+            # Nova versão da planilha: acrescenta apenas os registros novos
+            if suporta_incremental(conn):
+                with st.spinner("Atualizando o banco com os novos registros da planilha..."):
+                    novos = atualizar_excel(conn, planilha)
+                invalidar_cache()
+                marcar_verificado(planilha)
+                st.success(f"Banco atualizado com {novos} novos registros.")
+                return
+
+        # Leitura da planilha em lotes, com barra de progresso
+        barra = st.progress(0.0, text="Carregando microdados do Excel...")
+
+        def progresso(gravadas, total):
+            fracao = min(gravadas / total, 1.0) if total else 0.0
+            barra.progress(fracao, text=f"Carregando microdados do Excel... {gravadas:,} linhas")
+
+        ingerir_excel(conn, planilha, progresso=progresso)
+        barra.empty()
+        invalidar_cache()
+        marcar_verificado(planilha)
         st.success("Dados carregados e salvos no SQLite com sucesso!")
-    finally:
-        cursor.close()
-        conn.close()
+
+# Medição das etapas deste rerun (exibida no painel de depuração)
+iniciar_execucao('Abertura')
 
 # Carregar dados para tratamento inicial
-tratamento_data()
+with etapa('verificacao_banco'):
+    tratamento_data()
 
 # Configuração principal do Streamlit
 st.sidebar.title("Microdados de Violência Doméstica em Pernambuco")
 tab = st.sidebar.radio("Selecione a análise:", ["About", "Dados de Violência Doméstica", "Probabilidades Futuras"])
 
 # Exibir o conteúdo com base na aba selecionada
+# Os módulos de cada aba (plotly, modelos) são importados apenas quando a aba é aberta
 if tab == "About":
+    from about import about
     about()
 elif tab == "Dados de Violência Doméstica":
+    from visualizacao import visualizacao
     visualizacao()
 elif tab == "Probabilidades Futuras":
+    from predicao import predition
     predition()
+
+# Painel opcional com as etapas medidas neste rerun e no processo
+painel_depuracao()
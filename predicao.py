@@ -1,52 +1,20 @@
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
-import sqlite3
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-import time
 
-
-# Função para carregar dados do SQLite
-def load_data():
-    # Conecta ao banco SQLite
-    conn = sqlite3.connect('violencia_dm.db')
-
-    # Lê os dados da tabela 'violencia_domestica' para um DataFrame
-    violencia_dm = pd.read_sql_query("SELECT * FROM violencia_domestica", conn)
-
-    # Fecha a conexão com o banco
-    conn.close()
-
-    # Retorna o DataFrame
-    return violencia_dm
-
-
-# Função para predição com regressão linear
-def preditor_linear(data, group_col, target_col):
-    resultados = {}
-    anos = sorted(data['ANO'].unique())
-    anos_futuros = np.arange(max(anos) + 1, max(anos) + 6)  # Próximos 5 anos
-
-    for group, subset in data.groupby(group_col):
-        X = subset['ANO'].values.reshape(-1, 1)
-        y = subset[target_col].values
-        model = LinearRegression()
-        model.fit(X, y)
-        previsoes = model.predict(anos_futuros.reshape(-1, 1))
-        resultados[group] = {ano: max(int(pred), 0) for ano, pred in zip(anos_futuros, previsoes)}
-    return resultados
+from dados import agregar
+from filtros import barra_filtros
+from instrumentacao import definir_visao, marcar
+from previsoes import HORIZONTE_PADRAO, obter_previsao
+from selecao_modelos import SERIES, matriz_anual, obter_selecao
+from series_temporais import MODELOS, analisar, resumo_backtest
 
 
 # Função principal para o app
 def predition():
     st.title('Análise e Predição de Crimes')
-    with st.spinner("Aguarde processando os dados e criando as predições..."):
-        time.sleep(5)
-
-    violencia_dm = load_data()
-    violencia_dm['ANO'] = pd.to_numeric(violencia_dm['ANO'], errors='coerce')
 
     st.sidebar.header('Selecione a Análise:')
     analysis = st.sidebar.selectbox(
@@ -54,24 +22,30 @@ def predition():
         [
             'Predição de Crimes Temporal',
             'Predição dos Crimes com Maiores Incidências',
-            # 'Evolução das Cidades com Maior Incidência de Crimes',
+            'Evolução das Cidades com Maior Incidência de Crimes',
             'Evolução do Total de Crimes por Região Geográfica',
+            'Previsão Mensal e Semanal com Backtest',
+            'Seleção Automática de Modelos com Intervalo de Previsão',
         ]
     )
+    horizonte = st.sidebar.slider('Anos de previsão:', 1, 10, HORIZONTE_PADRAO)
 
-    if analysis == 'Predição de Crimes Temporal':
-        df_ano = violencia_dm.groupby('ANO')['TOTAL'].sum().reset_index()
-        df_ano.columns = ['ANO', 'TOTAL']
-
-        X = df_ano[['ANO']]
-        y = df_ano['TOTAL']
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Etapas medidas (consulta, modelo, figura e renderização) aparecem no painel de depuração
+    definir_visao(f'Previsões: {analysis}')
 
-        model = LinearRegression()
-        model.fit(X_train, y_train)
+    # Filtros aplicados ao histórico usado pelos modelos
+    filtros = barra_filtros()
+    marcar('filtros')
+    if agregar(['ANO'], filtros=filtros).empty:
+        st.warning("Nenhum registro encontrado para os filtros selecionados.")
+        return
 
-        anos_futuros = pd.DataFrame({'ANO': np.arange(df_ano['ANO'].max() + 1, df_ano['ANO'].max() + 6)})
-        predicoes = model.predict(anos_futuros)
+    if analysis == 'Predição de Crimes Temporal':
+        df_ano = agregar(['ANO'], filtros=filtros)
+        marcar('consulta', df_ano)
+        anos_futuros = obter_previsao('TEMPORAL', horizonte, filtros)
+        marcar('modelo', anos_futuros)
+        predicoes = anos_futuros['TOTAL']
 
         st.subheader('Previsão do Número de Crimes para os Próximos Anos')
         fig = px.line(
@@ -80,18 +54,17 @@ def predition():
             title='Evolução e Previsão do Número de Crimes',
             labels={'x': 'Ano', 'y': 'Número de Crimes'}
         )
+        marcar('figura')
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     elif analysis == 'Predição dos Crimes com Maiores Incidências':
-        crime_data = violencia_dm.groupby(['ANO', 'NATUREZA'], as_index=False)['TOTAL'].sum()
-        previsoes_crime = preditor_linear(crime_data, 'NATUREZA', 'TOTAL')
+        previsoes_crime = obter_previsao('NATUREZA', horizonte, filtros)
+        marcar('modelo', previsoes_crime)
 
         st.subheader('Predição de Crimes por Natureza')
-        rows_crime = []
-        for crime, anos in previsoes_crime.items():
-            for ano, total in anos.items():
-                rows_crime.append({'Natureza': crime, 'Ano': ano, 'Total': total})
-        df_crime = pd.DataFrame(rows_crime)
+        df_crime = previsoes_crime.rename(columns={'NATUREZA': 'Natureza', 'ANO': 'Ano', 'TOTAL': 'Total'})
+        marcar('transformacao', df_crime)
 
         fig = px.line(
             df_crime,
@@ -101,39 +74,45 @@ def predition():
             title='Predição de Crimes por Natureza',
             labels={'Ano': 'Ano', 'Total': 'Total de Ocorrências'}
         )
+        marcar('figura')
         st.plotly_chart(fig)
+        marcar('renderizacao')
+
+    elif analysis == 'Evolução das Cidades com Maior Incidência de Crimes':
+        previsoes_cidade = obter_previsao('MUNICIPIO', horizonte, filtros)
+        marcar('modelo', previsoes_cidade)
+
+        st.subheader('Predição de Cidades com Maior Incidência de Crimes')
+        quantidade = st.sidebar.slider('Quantidade de cidades:', 5, 30, 10)
+        # Cidades com maior total previsto no último ano do horizonte
+        ultimo_ano = previsoes_cidade['ANO'].max()
+        maiores = previsoes_cidade[previsoes_cidade['ANO'] == ultimo_ano].nlargest(quantidade, 'TOTAL')['MUNICIPIO']
+        df_cidade = previsoes_cidade[previsoes_cidade['MUNICIPIO'].isin(maiores)].rename(
+            columns={'MUNICIPIO': 'Cidade', 'ANO': 'Ano', 'TOTAL': 'Total'}
+        )
+        marcar('transformacao', df_cidade)
 
-    # elif analysis == 'Evolução das Cidades com Maior Incidência de Crimes':
-    #     cidade_data = violencia_dm.groupby(['ANO', 'MUNICIPIO'], as_index=False)['TOTAL'].sum()
-    #     previsoes_cidade = preditor_linear(cidade_data, 'MUNICIPIO', 'TOTAL')
-    #
-    #     st.subheader('Predição de Cidades com Maior Incidência de Crimes')
-    #     rows_cidade = []
-    #     for cidade, anos in previsoes_cidade.items():
-    #         for ano, total in anos.items():
-    #             rows_cidade.append({'Cidade': cidade, 'Ano': ano, 'Total': total})
-    #     df_cidade = pd.DataFrame(rows_cidade)
-    #
-    #     fig = px.line(
-    #         df_cidade,
-    #         x='Ano',
-    #         y='Total',
-    #         color='Cidade',
-    #         title='Predição de Cidades com Maior Incidência de Crimes',
-    #         labels={'Ano': 'Ano', 'Total': 'Total de Ocorrências'}
-    #     )
-    #     st.plotly_chart(fig)
+        fig = px.line(
+            df_cidade,
+            x='Ano',
+            y='Total',
+            color='Cidade',
+            title='Predição de Cidades com Maior Incidência de Crimes',
+            labels={'Ano': 'Ano', 'Total': 'Total de Ocorrências'}
+        )
+        marcar('figura')
+        st.plotly_chart(fig)
+        marcar('renderizacao')
 
     elif analysis == 'Evolução do Total de Crimes por Região Geográfica':
-        regiao_data = violencia_dm.groupby(['ANO', 'REGIAO_GEOGRAFICA'], as_index=False)['TOTAL'].sum()
-        previsoes_regiao = preditor_linear(regiao_data, 'REGIAO_GEOGRAFICA', 'TOTAL')
+        previsoes_regiao = obter_previsao('REGIAO_GEOGRAFICA', horizonte, filtros)
+        marcar('modelo', previsoes_regiao)
 
         st.subheader('Predição de Crimes por Região Geográfica')
-        rows_regiao = []
-        for regiao, anos in previsoes_regiao.items():
-            for ano, total in anos.items():
-                rows_regiao.append({'Região Geográfica': regiao, 'Ano': ano, 'Total': total})
-        df_regiao = pd.DataFrame(rows_regiao)
+        df_regiao = previsoes_regiao.rename(
+            columns={'REGIAO_GEOGRAFICA': 'Região Geográfica', 'ANO': 'Ano', 'TOTAL': 'Total'}
+        )
+        marcar('transformacao', df_regiao)
 
         fig = px.line(
             df_regiao,
@@ -143,7 +122,96 @@ def predition():
             title='Predição de Crimes por Região Geográfica',
             labels={'Ano': 'Ano', 'Total': 'Total de Ocorrências'}
         )
+        marcar('figura')
+        st.plotly_chart(fig)
+        marcar('renderizacao')
+
+    elif analysis == 'Previsão Mensal e Semanal com Backtest':
+        frequencia = st.sidebar.radio('Frequência:', ['Mensal', 'Semanal'])
+        agrupamento = st.sidebar.selectbox('Agrupar por:', ['Total', 'NATUREZA', 'REGIAO_GEOGRAFICA'])
+        modelo = st.sidebar.selectbox('Modelo:', list(MODELOS))
+        passos = st.sidebar.slider('Períodos à frente:', 4, 24, 12)
+
+        with st.spinner("Ajustando os modelos e executando o backtest..."):
+            historico, previsao, metricas = analisar(
+                'M' if frequencia == 'Mensal' else 'W',
+                None if agrupamento == 'Total' else agrupamento,
+                modelo,
+                passos,
+                filtros=filtros
+            )
+        marcar('modelo', historico)
+
+        st.subheader(f'Previsão {frequencia} de Crimes - {modelo}')
+        df_serie = pd.concat([
+            historico.assign(Tipo='Observado'),
+            previsao.assign(Tipo='Previsto'),
+        ], ignore_index=True)
+        marcar('transformacao', df_serie)
+
+        fig = px.line(
+            df_serie,
+            x='PERIODO',
+            y='TOTAL',
+            color='GRUPO',
+            line_dash='Tipo',
+            title=f'Série {frequencia} e Previsão de Crimes',
+            labels={'PERIODO': 'Período', 'TOTAL': 'Total de Ocorrências', 'GRUPO': 'Grupo'}
+        )
+        marcar('figura')
+        st.plotly_chart(fig)
+        marcar('renderizacao')
+
+        st.subheader('Erro dos Modelos no Backtest (origem móvel)')
+        st.dataframe(resumo_backtest(metricas))
+        marcar('renderizacao', metricas)
+
+    elif analysis == 'Seleção Automática de Modelos com Intervalo de Previsão':
+        serie = st.sidebar.selectbox('Série:', list(SERIES), format_func=lambda nome: ' x '.join(SERIES[nome]))
+
+        with st.spinner("Avaliando os modelos de cada série..."):
+            erros, previsoes = obter_selecao(serie, filtros, horizonte)
+        marcar('modelo', erros)
+
+        Y, grupos, anos = matriz_anual(serie, filtros)
+        # Grupos com maior total no último ano observado aparecem selecionados por padrão
+        padrao = [grupos[i] for i in np.argsort(-Y[:, -1])[:3]]
+        selecionados = st.multiselect('Grupos:', grupos, default=padrao)
+        marcar('transformacao', previsoes)
+
+        st.subheader('Previsão do Modelo Vencedor com Intervalo de 95%')
+        fig = go.Figure()
+        cores = px.colors.qualitative.Plotly
+        for i, grupo in enumerate(selecionados):
+            cor = cores[i % len(cores)]
+            futuro = previsoes[previsoes['GRUPO'] == grupo]
+            fig.add_trace(go.Scatter(
+                x=anos, y=Y[grupos.index(grupo)], mode='lines+markers', name=grupo, line={'color': cor},
+                legendgroup=grupo
+            ))
+            fig.add_trace(go.Scatter(
+                x=futuro['ANO'].tolist() + futuro['ANO'].tolist()[::-1],
+                y=futuro['SUPERIOR'].tolist() + futuro['INFERIOR'].tolist()[::-1],
+                fill='toself', fillcolor=cor, opacity=0.2, line={'width': 0}, hoverinfo='skip',
+                showlegend=False, legendgroup=grupo
+            ))
+            fig.add_trace(go.Scatter(
+                x=futuro['ANO'], y=futuro['PREVISTO'], mode='lines', line={'color': cor, 'dash': 'dash'},
+                name=f"{grupo} ({futuro['MODELO'].iloc[0]})" if len(futuro) else grupo, legendgroup=grupo
+            ))
+        fig.update_layout(
+            title='Histórico e Previsão por Grupo', xaxis_title='Ano', yaxis_title='Total de Ocorrências'
+        )
+        marcar('figura')
         st.plotly_chart(fig)
+        marcar('renderizacao')
+
+        st.subheader('Modelos Vencedores e Erro Médio no Backtest')
+        resumo = erros.groupby('MODELO', sort=False).agg(
+            Vitorias=('VENCEDOR', 'sum'), MAE_medio=('MAE', 'mean')
+        ).round(2).reset_index()
+        st.dataframe(resumo, hide_index=True)
+        marcar('renderizacao', resumo)
 
 
 if __name__ == '__main__':
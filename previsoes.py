@@ -0,0 +1,204 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+from conexoes import escrita, leitura
+from dados import agregar, ler_metadado, normalizar_filtros, versao_conteudo
+
+TABELA_PREVISOES = 'previsoes'
+HORIZONTE_PADRAO = 5
+
+# Limites do cache: entradas mantidas em memória e previsões avulsas (parâmetros fora do padrão) no banco
+MAXIMO_MEMORIA = 64
+MAXIMO_AVULSAS = 200
+
+# Análises de previsão e a coluna de agrupamento de cada uma (None para o total geral)
+ANALISES = {
+    'TEMPORAL': None,
+    'NATUREZA': 'NATUREZA',
+    'REGIAO_GEOGRAFICA': 'REGIAO_GEOGRAFICA',
+    'MUNICIPIO': 'MUNICIPIO',
+}
+
+# Cache LRU em memória compartilhado pelas sessões do processo
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+# Função para predição com regressão linear
+# Ajusta todas as séries de uma vez: monta a matriz densa grupo x ano e resolve os mínimos quadrados
+# de cada linha em forma fechada com NumPy (anos ausentes de um grupo ficam fora do ajuste daquele grupo)
+# Retorna um DataFrame no formato longo com as colunas group_col, 'ANO' e target_col
+def preditor_linear(data, group_col, target_col, horizonte=HORIZONTE_PADRAO):
+    matriz = data.pivot_table(index=group_col, columns='ANO', values=target_col, aggfunc='sum', observed=True)
+    anos = matriz.columns.to_numpy(dtype=float)
+    anos_futuros = np.arange(int(anos.max()) + 1, int(anos.max()) + 1 + horizonte)  # Próximos anos (5 por padrão)
+
+    y = matriz.to_numpy(dtype=float)
+    presente = ~np.isnan(y)
+    y = np.where(presente, y, 0.0)
+    x = np.where(presente, anos - anos.mean(), 0.0)  # Anos centralizados para estabilidade numérica
+
+    n = presente.sum(axis=1)
+    soma_x = x.sum(axis=1)
+    soma_y = y.sum(axis=1)
+    denominador = n * (x * x).sum(axis=1) - soma_x ** 2
+    numerador = n * (x * y).sum(axis=1) - soma_x * soma_y
+    # Séries com um único ano (ou anos constantes) ficam com inclinação zero, como no LinearRegression
+    inclinacao = np.divide(numerador, denominador, out=np.zeros_like(numerador), where=denominador != 0)
+    intercepto = (soma_y - inclinacao * soma_x) / n
+
+    previsoes = intercepto[:, None] + inclinacao[:, None] * (anos_futuros - anos.mean())[None, :]
+    previsoes = np.maximum(np.trunc(previsoes), 0).astype(int)
+
+    return pd.DataFrame({
+        group_col: np.repeat(matriz.index.to_numpy(), len(anos_futuros)),
+        'ANO': np.tile(anos_futuros, len(matriz)),
+        target_col: previsoes.ravel(),
+    })
+
+
+# Função para predição do total geral de crimes (regressão linear com separação treino/teste)
+def preditor_temporal(df_ano, horizonte=HORIZONTE_PADRAO):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
+
+    X = df_ano[['ANO']]
+    y = df_ano['TOTAL']
+    if len(df_ano) > 1:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    else:
+        # Recortes com um único ano não têm o que separar para teste
+        X_train, y_train = X, y
+
+    model = LinearRegression()
+    model.fit(X_train, y_train)
+
+    anos_futuros = pd.DataFrame({'ANO': np.arange(df_ano['ANO'].max() + 1, df_ano['ANO'].max() + 1 + horizonte)})
+    anos_futuros['TOTAL'] = model.predict(anos_futuros[['ANO']])
+    return anos_futuros
+
+
+# Função para calcular uma previsão a partir dos agregados do banco, opcionalmente filtrados
+# Um recorte sem registros resulta em uma previsão vazia
+def calcular_previsao(analise, horizonte=HORIZONTE_PADRAO, filtros=None):
+    if analise not in ANALISES:
+        raise ValueError(f"Análise de previsão desconhecida: {analise}")
+    coluna = ANALISES[analise]
+    if coluna is None:
+        historico = agregar(['ANO'], filtros=filtros)
+        if historico.empty:
+            return pd.DataFrame({'ANO': [], 'TOTAL': []})
+        return preditor_temporal(historico, horizonte)
+    historico = agregar(['ANO', coluna], filtros=filtros)
+    if historico.empty:
+        return pd.DataFrame({coluna: [], 'ANO': [], 'TOTAL': []})
+    return preditor_linear(historico, coluna, 'TOTAL', horizonte)
+
+
+# Função para serializar os parâmetros do modelo e os filtros (parte da chave do cache)
+def _parametros(horizonte, filtros=()):
+    parametros = {'modelo': 'linear', 'horizonte': int(horizonte)}
+    if filtros:
+        parametros['filtros'] = [[coluna, list(valor)] for coluna, valor in filtros]
+    return json.dumps(parametros, sort_keys=True)
+
+
+# Função para criar a tabela de previsões persistidas
+def _criar_tabela(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_PREVISOES} (
+            VERSAO TEXT,
+            ANALISE TEXT,
+            PARAMETROS TEXT,
+            PADRAO INTEGER,
+            ACESSO REAL,
+            DADOS TEXT,
+            PRIMARY KEY (VERSAO, ANALISE, PARAMETROS)
+        )
+    """)
+
+
+# Função para ler uma previsão persistida e se ela é padrão (None se não existir)
+def _ler_persistida(conn, versao, analise, parametros):
+    try:
+        linha = conn.execute(
+            f"SELECT DADOS, PADRAO FROM {TABELA_PREVISOES} WHERE VERSAO = ? AND ANALISE = ? AND PARAMETROS = ?",
+            (versao, analise, parametros)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if linha is None:
+        return None
+    return pd.read_json(StringIO(linha[0]), orient='split'), bool(linha[1])
+
+
+# Função para persistir uma previsão; as avulsas são limitadas às MAXIMO_AVULSAS gravadas mais recentemente
+def _gravar_persistida(conn, versao, analise, parametros, previsao, padrao):
+    _criar_tabela(conn)
+    conn.execute(
+        f"INSERT OR REPLACE INTO {TABELA_PREVISOES} VALUES (?, ?, ?, ?, ?, ?)",
+        (versao, analise, parametros, int(padrao), time.time(), previsao.to_json(orient='split', index=False))
+    )
+    if not padrao:
+        conn.execute(f"""
+            DELETE FROM {TABELA_PREVISOES}
+            WHERE PADRAO = 0 AND rowid NOT IN (
+                SELECT rowid FROM {TABELA_PREVISOES} WHERE PADRAO = 0 ORDER BY ACESSO DESC LIMIT ?
+            )
+        """, (MAXIMO_AVULSAS,))
+
+
+# Função para obter uma previsão: cache em memória, depois banco, e só então o ajuste do modelo
+# Previsões filtradas são guardadas como avulsas, uma por combinação de filtros
+def obter_previsao(analise, horizonte=HORIZONTE_PADRAO, filtros=None):
+    versao = versao_conteudo()
+    filtros = normalizar_filtros(filtros)
+    parametros = _parametros(horizonte, filtros)
+    chave = (versao, analise, parametros)
+    with _lru_lock:
+        if chave in _lru:
+            _lru.move_to_end(chave)
+            return _lru[chave]
+
+    persistida = None
+    if versao is not None:
+        with leitura() as conn:
+            persistida = _ler_persistida(conn, versao, analise, parametros)
+
+    if persistida is not None:
+        previsao, _ = persistida
+    else:
+        previsao = calcular_previsao(analise, horizonte, filtros)
+        if versao is not None:
+            padrao = horizonte == HORIZONTE_PADRAO and not filtros
+            with escrita() as conn:
+                _gravar_persistida(conn, versao, analise, parametros, previsao, padrao)
+
+    with _lru_lock:
+        _lru[chave] = previsao
+        while len(_lru) > MAXIMO_MEMORIA:
+            _lru.popitem(last=False)
+    return previsao
+
+
+# Função para pré-calcular as previsões padrão de todas as análises (chamada ao fim da carga)
+# Previsões de versões anteriores dos dados são descartadas
+def precomputar_previsoes(conn):
+    versao = ler_metadado(conn, 'versao_dados')
+    if versao is None:
+        return
+    _criar_tabela(conn)
+    conn.execute(f"DELETE FROM {TABELA_PREVISOES} WHERE VERSAO != ?", (versao,))
+    parametros = _parametros(HORIZONTE_PADRAO)
+    for analise in ANALISES:
+        if _ler_persistida(conn, versao, analise, parametros) is None:
+            previsao = calcular_previsao(analise, HORIZONTE_PADRAO)
+            _gravar_persistida(conn, versao, analise, parametros, previsao, True)
+    conn.commit()
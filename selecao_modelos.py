@@ -0,0 +1,298 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from conexoes import escrita, leitura
+from dados import agregar, gravar_metadado, ler_metadado, normalizar_filtros, versao_conteudo
+from previsoes import HORIZONTE_PADRAO
+
+TABELA_ERROS = 'selecao_modelos'
+TABELA_SELECIONADAS = 'previsoes_selecionadas'
+
+# Séries anuais avaliadas e as colunas que identificam cada série
+SERIES = {
+    'NATUREZA': ['NATUREZA'],
+    'REGIAO_GEOGRAFICA': ['REGIAO_GEOGRAFICA'],
+    'MUNICIPIO': ['MUNICIPIO'],
+    'MUNICIPIO_NATUREZA': ['MUNICIPIO', 'NATUREZA'],
+}
+SEPARADOR_GRUPO = ' / '
+
+# Backtest: anos finais usados como origens (previsão um passo à frente) e anos mínimos de treino
+DOBRAS = 3
+MINIMO_TREINO = 4
+
+# Intervalo de previsão de 95% (quantil da normal), alargado com a raiz do horizonte
+Z_INTERVALO = 1.96
+
+# Volume mínimo de trabalho (séries x anos) por processo do pool: cada processo 'spawn' reimporta NumPy,
+# pandas e os módulos do app (~0,8 s), enquanto o ajuste custa ~8 µs por célula. Abaixo de dois processos
+# com esse volume o ajuste roda no próprio processo
+MINIMO_PARALELO = 500_000
+
+
+# Regressão linear no tempo; o desenho é o mesmo para todas as séries, então um único lstsq ajusta todas
+def linear(Y, horizonte):
+    return _polinomio(Y, horizonte, 1)
+
+
+# Regressão polinomial de grau 2 no tempo (tempo escalado para manter o sistema bem condicionado)
+def polinomial(Y, horizonte):
+    return _polinomio(Y, horizonte, 2)
+
+
+def _polinomio(Y, horizonte, grau):
+    T = Y.shape[1]
+    t = np.arange(T + horizonte) / max(T - 1, 1)
+    desenho = np.vander(t, grau + 1, increasing=True)
+    coeficientes, *_ = np.linalg.lstsq(desenho[:T], Y.T, rcond=None)
+    return (desenho[T:] @ coeficientes).T
+
+
+# GLM de Poisson com ligação log e tendência linear, ajustado por IRLS em todas as séries ao mesmo tempo
+def poisson(Y, horizonte, iteracoes=25):
+    G, T = Y.shape
+    t = np.arange(T + horizonte) / max(T - 1, 1)
+    desenho = np.column_stack([np.ones_like(t), t])
+    X = desenho[:T]
+    beta = np.column_stack([np.log(Y.mean(axis=1) + 0.5), np.zeros(G)])
+    for _ in range(iteracoes):
+        eta = np.clip(beta @ X.T, -20, 20)
+        mu = np.exp(eta)
+        z = eta + (Y - mu) / mu
+        # Sistema 2x2 ponderado de cada série: (X' W X) beta = X' W z
+        A = np.einsum('gt,ti,tj->gij', mu, X, X) + 1e-9 * np.eye(2)
+        b = np.einsum('gt,ti,gt->gi', mu, X, z)
+        beta = np.linalg.solve(A, b[..., None])[..., 0]
+    return np.exp(np.clip(beta @ desenho[T:].T, -20, 20))
+
+
+# Suavização exponencial de Holt (nível + tendência aditiva)
+# Os parâmetros de cada série são escolhidos em uma grade pelo menor erro um passo à frente no treino
+def suavizacao(Y, horizonte, alfas=(0.2, 0.4, 0.6, 0.8), betas=(0.1, 0.3)):
+    G, T = Y.shape
+    if T < 2:
+        return np.repeat(Y[:, -1:], horizonte, axis=1)
+    melhor_erro = np.full(G, np.inf)
+    melhor_previsao = np.zeros((G, horizonte))
+    passos = np.arange(1, horizonte + 1)
+    for alfa in alfas:
+        for beta in betas:
+            nivel = Y[:, 0].copy()
+            tendencia = Y[:, 1] - Y[:, 0]
+            erro = np.zeros(G)
+            for t in range(1, T):
+                erro += (Y[:, t] - (nivel + tendencia)) ** 2
+                nivel_anterior = nivel
+                nivel = alfa * Y[:, t] + (1 - alfa) * (nivel + tendencia)
+                tendencia = beta * (nivel - nivel_anterior) + (1 - beta) * tendencia
+            melhor = erro < melhor_erro
+            melhor_erro[melhor] = erro[melhor]
+            melhor_previsao[melhor] = nivel[melhor, None] + passos[None, :] * tendencia[melhor, None]
+    return melhor_previsao
+
+
+MODELOS = {
+    'Linear': linear,
+    'Polinomial (grau 2)': polinomial,
+    'Poisson (GLM)': poisson,
+    'Suavização exponencial (Holt)': suavizacao,
+}
+
+
+# Função para prever com um modelo (previsões negativas viram zero)
+def prever(Y, modelo, horizonte):
+    return np.maximum(MODELOS[modelo](Y, horizonte), 0)
+
+
+# Função para avaliar e selecionar os modelos de um bloco de séries (executada nos processos do pool)
+# Retorna o MAE de cada modelo no backtest (grupos x modelos), o índice do vencedor,
+# a previsão do vencedor e o desvio dos seus erros (base do intervalo)
+def selecionar_bloco(Y, horizonte):
+    T = Y.shape[1]
+    modelos = list(MODELOS)
+    origens = range(max(MINIMO_TREINO, T - DOBRAS), T)
+    erros = np.zeros((len(Y), len(modelos), len(origens)))
+    for j, modelo in enumerate(modelos):
+        for k, origem in enumerate(origens):
+            erros[:, j, k] = prever(Y[:, :origem], modelo, 1)[:, 0] - Y[:, origem]
+
+    if len(origens):
+        mae = np.abs(erros).mean(axis=2)
+        vencedor = mae.argmin(axis=1)
+        desvio = np.sqrt((erros[np.arange(len(Y)), vencedor] ** 2).mean(axis=1))
+    else:
+        # Séries curtas demais para o backtest ficam com o modelo linear e o desvio das variações anuais
+        mae = np.full((len(Y), len(modelos)), np.nan)
+        vencedor = np.zeros(len(Y), dtype=int)
+        desvio = np.diff(Y, axis=1).std(axis=1) if T > 1 else np.zeros(len(Y))
+
+    previsao = np.zeros((len(Y), horizonte))
+    for j, modelo in enumerate(modelos):
+        linhas = vencedor == j
+        if linhas.any():
+            previsao[linhas] = prever(Y[linhas], modelo, horizonte)
+    return mae, vencedor, previsao, desvio
+
+
+# Função para selecionar os modelos de todas as séries, dividindo-as em blocos entre os núcleos
+# Cada bloco é ajustado vetorialmente; o pool usa 'spawn' para não duplicar as threads do Streamlit
+# O número de processos é limitado pelo volume de trabalho (MINIMO_PARALELO células por processo)
+def selecionar(Y, horizonte=HORIZONTE_PADRAO, trabalhadores=None):
+    trabalhadores = min(trabalhadores or os.cpu_count() or 1, Y.size // MINIMO_PARALELO)
+    if trabalhadores <= 1:
+        return selecionar_bloco(Y, horizonte)
+
+    blocos = [bloco for bloco in np.array_split(Y, trabalhadores * 4) if len(bloco)]
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=trabalhadores, mp_context=contexto) as executor:
+        resultados = list(executor.map(selecionar_bloco, blocos, [horizonte] * len(blocos)))
+    return tuple(np.concatenate(partes) for partes in zip(*resultados))
+
+
+# Função para montar a matriz densa grupo x ano de uma série (anos sem registros entram com zero)
+def matriz_anual(analise, filtros=None):
+    if analise not in SERIES:
+        raise ValueError(f"Série desconhecida: {analise}")
+    colunas = SERIES[analise]
+    anual = agregar(['ANO'] + colunas, filtros=filtros)
+    grupos = anual[colunas].astype(str).agg(SEPARADOR_GRUPO.join, axis=1)
+    matriz = anual.assign(GRUPO=grupos).pivot_table(
+        index='GRUPO', columns='ANO', values='TOTAL', aggfunc='sum', fill_value=0
+    )
+    return matriz.to_numpy(dtype=float), list(matriz.index), [int(ano) for ano in matriz.columns]
+
+
+# Função para executar a seleção de uma série e montar as tabelas de erros e de previsões
+def calcular_selecao(analise, filtros=None, horizonte=HORIZONTE_PADRAO, trabalhadores=None):
+    Y, grupos, anos = matriz_anual(analise, filtros)
+    modelos = list(MODELOS)
+    if not grupos:
+        return (
+            pd.DataFrame(columns=['GRUPO', 'MODELO', 'MAE', 'VENCEDOR']),
+            pd.DataFrame(columns=['GRUPO', 'MODELO', 'ANO', 'PREVISTO', 'INFERIOR', 'SUPERIOR']),
+        )
+    mae, vencedor, previsao, desvio = selecionar(Y, horizonte, trabalhadores)
+
+    erros = pd.DataFrame({
+        'GRUPO': np.repeat(grupos, len(modelos)),
+        'MODELO': np.tile(modelos, len(grupos)),
+        'MAE': mae.ravel(),
+        'VENCEDOR': (np.arange(len(modelos))[None, :] == vencedor[:, None]).ravel(),
+    })
+    margem = Z_INTERVALO * desvio[:, None] * np.sqrt(np.arange(1, horizonte + 1))[None, :]
+    anos_futuros = np.arange(anos[-1] + 1, anos[-1] + 1 + horizonte)
+    previsoes = pd.DataFrame({
+        'GRUPO': np.repeat(grupos, horizonte),
+        'MODELO': np.repeat(np.array(modelos)[vencedor], horizonte),
+        'ANO': np.tile(anos_futuros, len(grupos)),
+        'PREVISTO': previsao.ravel(),
+        'INFERIOR': np.maximum(previsao - margem, 0).ravel(),
+        'SUPERIOR': (previsao + margem).ravel(),
+    })
+    return erros, previsoes
+
+
+# Função para criar as tabelas com os erros do backtest e as previsões dos modelos vencedores
+def _criar_tabelas(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_ERROS} (
+            VERSAO TEXT, ANALISE TEXT, GRUPO TEXT, MODELO TEXT, MAE REAL, VENCEDOR INTEGER
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_SELECIONADAS} (
+            VERSAO TEXT, ANALISE TEXT, GRUPO TEXT, MODELO TEXT, ANO INTEGER,
+            PREVISTO REAL, INFERIOR REAL, SUPERIOR REAL
+        )
+    """)
+    for tabela in (TABELA_ERROS, TABELA_SELECIONADAS):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_analise ON {tabela} (VERSAO, ANALISE)")
+
+
+# Função para verificar se a seleção gravada corresponde à versão atual dos dados
+def selecao_atualizada(conn):
+    versao = ler_metadado(conn, 'versao_dados')
+    return versao is not None and ler_metadado(conn, 'versao_selecao') == versao
+
+
+# Função para executar a seleção de todas as séries e gravar o resultado (chamada ao fim da carga)
+# Resultados de versões anteriores dos dados são descartados
+def atualizar_selecao(conn, horizonte=HORIZONTE_PADRAO, trabalhadores=None):
+    versao = ler_metadado(conn, 'versao_dados')
+    if versao is None:
+        return
+    _criar_tabelas(conn)
+    for tabela in (TABELA_ERROS, TABELA_SELECIONADAS):
+        conn.execute(f"DELETE FROM {tabela}")
+    for analise in SERIES:
+        erros, previsoes = calcular_selecao(analise, horizonte=horizonte, trabalhadores=trabalhadores)
+        conn.executemany(
+            f"INSERT INTO {TABELA_ERROS} VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (versao, analise, grupo, modelo, None if np.isnan(mae) else float(mae), int(vencedor))
+                for grupo, modelo, mae, vencedor in erros.itertuples(index=False)
+            ]
+        )
+        conn.executemany(
+            f"INSERT INTO {TABELA_SELECIONADAS} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(versao, analise, *linha) for linha in previsoes.astype({'ANO': int}).itertuples(index=False)]
+        )
+    gravar_metadado(conn, 'versao_selecao', versao)
+    gravar_metadado(conn, 'parametros_selecao', json.dumps({'horizonte': horizonte, 'dobras': DOBRAS}))
+    conn.commit()
+
+
+# Função para ler a seleção gravada de uma série (None se não houver seleção da versão atual)
+def _ler_selecao(versao, analise):
+    with leitura() as conn:
+        if ler_metadado(conn, 'versao_selecao') != versao:
+            return None
+        erros = pd.read_sql_query(
+            f"SELECT GRUPO, MODELO, MAE, VENCEDOR FROM {TABELA_ERROS} WHERE VERSAO = ? AND ANALISE = ?",
+            conn, params=(versao, analise)
+        )
+        previsoes = pd.read_sql_query(
+            f"SELECT GRUPO, MODELO, ANO, PREVISTO, INFERIOR, SUPERIOR FROM {TABELA_SELECIONADAS} "
+            "WHERE VERSAO = ? AND ANALISE = ?",
+            conn, params=(versao, analise)
+        )
+    return erros.astype({'VENCEDOR': bool}), previsoes
+
+
+# Função com a seleção de uma série, em cache por versão dos dados e filtros
+# Seleções pedidas pelo painel (filtros ou horizonte fora do padrão) rodam no próprio processo, sem pool
+@lru_cache(maxsize=32)
+def _obter_selecao(versao, analise, filtros, horizonte):
+    if not filtros and horizonte == HORIZONTE_PADRAO and versao is not None:
+        gravada = _ler_selecao(versao, analise)
+        if gravada is not None:
+            return gravada
+    return calcular_selecao(analise, filtros, horizonte, trabalhadores=1)
+
+
+# Função para obter os erros do backtest e as previsões (com intervalo) dos modelos vencedores
+# Sem filtros e no horizonte padrão usa a seleção gravada na carga; nos demais casos ela é calculada
+# Os DataFrames retornados são compartilhados pelo cache: não devem ser alterados in-place
+def obter_selecao(analise, filtros=None, horizonte=HORIZONTE_PADRAO):
+    return _obter_selecao(versao_conteudo(), analise, normalizar_filtros(filtros), horizonte)
+
+
+# Função para refazer a seleção de modelos direto pela linha de comando
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Seleção de modelos de previsão por série anual.')
+    parser.add_argument('--trabalhadores', type=int, help='Processos do pool (padrão: número de CPUs)')
+    argumentos = parser.parse_args()
+
+    inicio = time.perf_counter()
+    with escrita() as conn:
+        atualizar_selecao(conn, trabalhadores=argumentos.trabalhadores)
+    print(f"Seleção de modelos atualizada em {time.perf_counter() - inicio:.1f} s")
@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from dados import normalizar_filtros, serie_temporal, versao_conteudo
+
+# Frequências suportadas: regra de reamostragem do pandas e período sazonal (em passos)
+FREQUENCIAS = {
+    'M': {'regra': 'MS', 'periodo': 12},
+    'W': {'regra': 'W-SUN', 'periodo': 52},
+}
+
+# Rótulo da série única quando não há coluna de agrupamento
+GRUPO_TOTAL = 'PERNAMBUCO'
+
+
+# Função para montar a matriz densa grupo x período a partir de DATA_FATO
+# Períodos sem registros entram com zero; na frequência semanal a última semana incompleta é descartada
+def montar_matriz(frequencia='M', coluna=None, filtros=None):
+    if frequencia not in FREQUENCIAS:
+        raise ValueError(f"Frequência desconhecida: {frequencia}")
+    serie = serie_temporal('M' if frequencia == 'M' else 'D', coluna, filtros)
+    datas = pd.to_datetime(serie['PERIODO'], format='%Y-%m' if frequencia == 'M' else '%Y-%m-%d')
+    grupos = serie[coluna] if coluna is not None else pd.Series(GRUPO_TOTAL, index=serie.index)
+
+    diaria = pd.DataFrame({'DATA': datas, 'GRUPO': grupos, 'TOTAL': serie['TOTAL']})
+    matriz = diaria.pivot_table(index='DATA', columns='GRUPO', values='TOTAL', aggfunc='sum', fill_value=0)
+    matriz = matriz.resample(FREQUENCIAS[frequencia]['regra']).sum()
+    if frequencia == 'W' and len(matriz) and datas.max() < matriz.index[-1]:
+        matriz = matriz.iloc[:-1]
+    return matriz.T.to_numpy(dtype=float), list(matriz.columns), matriz.index
+
+
+# Modelo ingênuo sazonal: repete o valor observado no mesmo ponto do último ciclo
+def sazonal_ingenuo(Y, horizonte, periodo):
+    T = Y.shape[1]
+    if T < periodo:
+        return np.repeat(Y[:, -1:], horizonte, axis=1)
+    indices = T - periodo + (np.arange(horizonte) % periodo)
+    return Y[:, indices]
+
+
+# Matriz de regressão com intercepto, tendência linear e indicadores da posição no ciclo
+def _desenho(inicio, tamanho, periodo):
+    t = np.arange(inicio, inicio + tamanho)
+    sazonal = np.eye(periodo)[t % periodo][:, 1:]
+    return np.column_stack([np.ones(tamanho), t, sazonal])
+
+
+# Modelo de tendência linear + indicadores sazonais (ex.: dummies de mês)
+# O desenho é o mesmo para todas as séries, então um único lstsq ajusta todos os grupos
+def tendencia_sazonal(Y, horizonte, periodo):
+    T = Y.shape[1]
+    coeficientes, *_ = np.linalg.lstsq(_desenho(0, T, periodo), Y.T, rcond=None)
+    return (_desenho(T, horizonte, periodo) @ coeficientes).T
+
+
+# Modelo de Holt-Winters aditivo, atualizado passo a passo para todos os grupos ao mesmo tempo
+def holt_winters(Y, horizonte, periodo, alfa=0.3, beta=0.05, gama=0.2):
+    G, T = Y.shape
+    if T < 2 * periodo:
+        return sazonal_ingenuo(Y, horizonte, periodo)
+
+    nivel = Y[:, :periodo].mean(axis=1)
+    tendencia = (Y[:, periodo:2 * periodo].mean(axis=1) - nivel) / periodo
+    sazonal = Y[:, :periodo] - nivel[:, None]
+    for t in range(T):
+        posicao = t % periodo
+        nivel_anterior = nivel
+        nivel = alfa * (Y[:, t] - sazonal[:, posicao]) + (1 - alfa) * (nivel + tendencia)
+        tendencia = beta * (nivel - nivel_anterior) + (1 - beta) * tendencia
+        sazonal[:, posicao] = gama * (Y[:, t] - nivel) + (1 - gama) * sazonal[:, posicao]
+
+    passos = np.arange(1, horizonte + 1)
+    return nivel[:, None] + passos[None, :] * tendencia[:, None] + sazonal[:, (T + passos - 1) % periodo]
+
+
+MODELOS = {
+    'Ingênuo sazonal': sazonal_ingenuo,
+    'Holt-Winters': holt_winters,
+    'Tendência + sazonalidade': tendencia_sazonal,
+}
+
+
+# Função para prever todas as séries da matriz com um modelo (previsões negativas viram zero)
+def prever(Y, modelo, horizonte, periodo):
+    return np.maximum(MODELOS[modelo](Y, horizonte, periodo), 0)
+
+
+# Função para avaliar um modelo em uma origem do backtest (erros por grupo)
+def _avaliar(Y, modelo, origem, horizonte, periodo):
+    real = Y[:, origem:origem + horizonte]
+    previsto = prever(Y[:, :origem], modelo, real.shape[1], periodo)
+    erro = previsto - real
+    soma = np.abs(previsto) + np.abs(real)
+    smape = np.divide(2 * np.abs(erro), soma, out=np.zeros_like(erro), where=soma != 0).mean(axis=1)
+    return modelo, origem, np.abs(erro).mean(axis=1), np.sqrt((erro ** 2).mean(axis=1)), smape
+
+
+# Função para o backtest com origem móvel (janela crescente) de vários modelos
+# Cada combinação modelo x origem roda em paralelo; dentro dela todos os grupos são avaliados vetorialmente
+# Retorna um DataFrame com MAE, RMSE e sMAPE por modelo, origem e grupo
+def backtest(Y, grupos, periodos, horizonte, periodo, dobras=3, modelos=None, trabalhadores=None):
+    modelos = list(modelos or MODELOS)
+    T = Y.shape[1]
+    origens = [T - horizonte * k for k in range(dobras, 0, -1) if T - horizonte * k >= periodo]
+    tarefas = [(modelo, origem) for modelo in modelos for origem in origens]
+
+    def executar(tarefa):
+        modelo, origem = tarefa
+        return _avaliar(Y, modelo, origem, horizonte, periodo)
+
+    with ThreadPoolExecutor(max_workers=trabalhadores or os.cpu_count()) as executor:
+        resultados = list(executor.map(executar, tarefas))
+
+    partes = [
+        pd.DataFrame({
+            'MODELO': modelo,
+            'ORIGEM': periodos[origem],
+            'GRUPO': grupos,
+            'MAE': mae,
+            'RMSE': rmse,
+            'SMAPE': smape,
+        })
+        for modelo, origem, mae, rmse, smape in resultados
+    ]
+    if not partes:
+        return pd.DataFrame(columns=['MODELO', 'ORIGEM', 'GRUPO', 'MAE', 'RMSE', 'SMAPE'])
+    return pd.concat(partes, ignore_index=True)
+
+
+# Função para resumir o backtest por modelo (média dos erros em todas as origens e grupos)
+def resumo_backtest(metricas):
+    return metricas.groupby('MODELO', as_index=False)[['MAE', 'RMSE', 'SMAPE']].mean().sort_values('MAE')
+
+
+# Função com o cálculo da análise, em cache por versão dos dados e combinação de parâmetros e filtros
+@lru_cache(maxsize=32)
+def _analisar(versao, frequencia, coluna, modelo, horizonte, dobras, filtros):
+    Y, grupos, periodos = montar_matriz(frequencia, coluna, filtros)
+    periodo = FREQUENCIAS[frequencia]['periodo']
+    if not len(periodos):
+        vazio = pd.DataFrame({'GRUPO': [], 'PERIODO': pd.to_datetime([]), 'TOTAL': []})
+        return vazio, vazio, backtest(Y, grupos, periodos, horizonte, periodo, dobras)
+
+    historico = pd.DataFrame({
+        'GRUPO': np.repeat(grupos, len(periodos)),
+        'PERIODO': np.tile(periodos, len(grupos)),
+        'TOTAL': Y.ravel(),
+    })
+    futuros = pd.date_range(periodos[-1], periods=horizonte + 1, freq=FREQUENCIAS[frequencia]['regra'])[1:]
+    previsto = prever(Y, modelo, horizonte, periodo)
+    previsao = pd.DataFrame({
+        'GRUPO': np.repeat(grupos, horizonte),
+        'PERIODO': np.tile(futuros, len(grupos)),
+        'TOTAL': previsto.ravel(),
+    })
+    metricas = backtest(Y, grupos, periodos, horizonte, periodo, dobras)
+    return historico, previsao, metricas
+
+
+# Função completa de análise: histórico, previsão do modelo escolhido e backtest de todos os modelos
+# Os DataFrames retornados são compartilhados pelo cache: não devem ser alterados in-place
+def analisar(frequencia='M', coluna=None, modelo='Holt-Winters', horizonte=12, dobras=3, filtros=None):
+    if modelo not in MODELOS:
+        raise ValueError(f"Modelo desconhecido: {modelo}")
+    return _analisar(versao_conteudo(), frequencia, coluna, modelo, horizonte, dobras, normalizar_filtros(filtros))
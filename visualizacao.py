@@ -1,49 +1,35 @@
-import json
-
-import pandas as pd
 import sqlite3
 import plotly.express as px
 import streamlit as st
 import plotly.graph_objects as go
 
-
-# Função para carregar dados do banco SQLite
-def load_data():
-    # Conecta ao banco SQLite
-    conn = sqlite3.connect('violencia_dm.db')
-    # Lê os dados da tabela 'violencia_domestica' para um DataFrame
-    violencia_dm = pd.read_sql_query("SELECT * FROM violencia_domestica", conn)
-    # Fecha a conexão com o banco
-    conn.close()
-    return violencia_dm
+from cache_figuras import figura_cacheada
+from conexoes import leitura
+from cubos import NOMES_DIAS, NOMES_MESES, fatiar, meses_observados, obter_cubo, reduzir
+from dados import agregar
+from filtros import barra_filtros
+from geografia import NIVEIS_DETALHE, geojson_simplificado, municipios_ibge, municipios_sem_correspondencia
+from instrumentacao import definir_visao, marcar
 
 # Verificar se o banco de dados está disponível
 def check_database():
-    conn = sqlite3.connect('violencia_dm.db')
-    cursor = conn.cursor()
-
-    # Verifica se a tabela existe
-    cursor.execute("""
-        SELECT name FROM sqlite_master WHERE type='table' AND name='violencia_domestica';
-    """)
-    tabela_existe = cursor.fetchone()
+    # Verifica se a tabela existe (um banco inexistente não pode ser aberto somente leitura)
+    try:
+        with leitura() as conn:
+            tabela_existe = conn.execute("""
+                SELECT name FROM sqlite_master WHERE type='table' AND name='violencia_domestica';
+            """).fetchone()
+    except sqlite3.OperationalError:
+        tabela_existe = None
 
     if not tabela_existe:
         st.error("Os dados não estão no banco SQLite. Por favor, carregue os dados primeiro.")
-        conn.close()
         st.stop()
 
-    # Fecha a conexão
-    conn.close()
-
 # Função principal para o app
 def visualizacao():
     st.title('Análise Interativa sobre Crimes Domésticos em Pernambuco')
 
-    # Carregar dados do banco
-    violencia_dm = load_data()
-    violencia_dm['ANO'] = pd.to_numeric(violencia_dm['ANO'], errors='coerce')
-
     # Barra lateral para seleção de visualização
     st.sidebar.header('Selecione a Visualização:')
     analysis = st.sidebar.selectbox('', [
@@ -53,147 +39,191 @@ def visualizacao():
         'Crime com Maior Incidência',
         'Top 10 Crimes com maior Relevância',
         'Crimes Domésticos Por Sexo e Natureza',
-        'Mapa de Crimes por Município'
+        'Mapa de Crimes por Município',
+        'Mapa de Calor - Mês x Dia da Semana',
+        'Faixa Etária x Natureza ao Longo dos Anos',
+        'Sazonalidade por Município'
     ])
 
+    # Etapas medidas (consulta, transformação, figura e renderização) aparecem no painel de depuração
+    definir_visao(f'Dados: {analysis}')
+
+    # Filtros aplicados a todas as análises (consultas parametrizadas, em cache por combinação)
+    filtros = barra_filtros()
+    marcar('filtros')
+    if agregar(['ANO'], medida='CASOS', filtros=filtros).empty:
+        st.warning("Nenhum registro encontrado para os filtros selecionados.")
+        return
+
+    # Em cada análise, construir() consulta os dados e monta a figura; figura_cacheada só a executa quando
+    # a figura ainda não foi gravada em disco para a versão atual dos dados e estes filtros
     # Análise 1: Distribuição de Crimes por Sexo ao Longo dos Anos'
     if analysis == 'Distribuição de Crimes - Região Geográfica':
         st.subheader('Análise Temporal de Crimes - Região Geográfica')
 
-        # Criar a tabela pivot para agrupar os dados por ANO e REGIAO_GEOGRAFICA
-        violenciaPivot_df = violencia_dm.pivot_table(
-            values='TOTAL',
-            index='ANO',
-            columns='REGIAO_GEOGRAFICA',
-            aggfunc='sum'
-        )
-
-        # Criar a figura
-        fig = go.Figure()
-
-        # Adicionar uma linha para cada região geográfica
-        for regiao in violenciaPivot_df.columns:
-            fig.add_trace(
-                go.Scatter(
-                    x=violenciaPivot_df.index,
-                    y=violenciaPivot_df[regiao],
-                    mode='lines+markers',
-                    name=regiao
+        def construir():
+            # Criar a tabela pivot com os totais agregados por ANO e REGIAO_GEOGRAFICA no SQLite
+            regiao_ano = agregar(['ANO', 'REGIAO_GEOGRAFICA'], filtros=filtros)
+            marcar('consulta', regiao_ano)
+            violenciaPivot_df = regiao_ano.pivot(
+                values='TOTAL',
+                index='ANO',
+                columns='REGIAO_GEOGRAFICA'
+            )
+            marcar('transformacao', violenciaPivot_df)
+
+            # Criar a figura
+            fig = go.Figure()
+
+            # Adicionar uma linha para cada região geográfica
+            for regiao in violenciaPivot_df.columns:
+                fig.add_trace(
+                    go.Scatter(
+                        x=violenciaPivot_df.index,
+                        y=violenciaPivot_df[regiao],
+                        mode='lines+markers',
+                        name=regiao
+                    )
                 )
+
+            # Ajustar o layout
+            fig.update_layout(
+                title='Comparação Temporal de Ocorrências por Ano e Região Geográfica',
+                xaxis_title='Ano',
+                yaxis_title='Total de Ocorrências',
+                legend_title='Região Geográfica',
+                template='plotly_white'
             )
+            return fig
 
-        # Ajustar o layout
-        fig.update_layout(
-            title='Comparação Temporal de Ocorrências por Ano e Região Geográfica',
-            xaxis_title='Ano',
-            yaxis_title='Total de Ocorrências',
-            legend_title='Região Geográfica',
-            template='plotly_white'
-        )
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 3: Top 10 Cidades com Mais Crimes
     elif analysis == 'Total de Casos em Pernambuco':
         st.subheader("Total de Casos em Pernambuco - ANO")
 
-        # Agrupar os dados para contar o número de casos por ano
-        df_ano = violencia_dm['ANO'].value_counts().reset_index()
-        df_ano.columns = ['ANO', 'Número de Casos']
-        df_ano = df_ano.sort_values('ANO')  # Ordenar os anos para manter a sequência
-
-        # Gráfico de barras
-        fig = px.bar(
-            df_ano,
-            x="ANO",
-            y="Número de Casos",
-            title="Total de Violência Doméstica em Pernambuco - ANO",
-            labels={"ANO": "Ano", "Número de Casos": "Número de Casos"},
-            color_discrete_sequence=["#1f77b4"]  # Cor única para todas as barras
-        )
+        def construir():
+            # Agrupar os dados para contar o número de casos por ano
+            df_ano = agregar(['ANO'], medida='CASOS', filtros=filtros)
+            marcar('consulta', df_ano)
+            df_ano = df_ano.rename(columns={'CASOS': 'Número de Casos'})
+            df_ano = df_ano.sort_values('ANO')  # Ordenar os anos para manter a sequência
+            marcar('transformacao', df_ano)
+
+            # Gráfico de barras
+            fig = px.bar(
+                df_ano,
+                x="ANO",
+                y="Número de Casos",
+                title="Total de Violência Doméstica em Pernambuco - ANO",
+                labels={"ANO": "Ano", "Número de Casos": "Número de Casos"},
+                color_discrete_sequence=["#1f77b4"]  # Cor única para todas as barras
+            )
 
-        # Ajustes de layout
-        fig.update_layout(
-            xaxis=dict(
-                tickmode="linear",  # Garantir que todos os anos apareçam no eixo X
-                tick0=df_ano["ANO"].min(),
-                dtick=1
-            ),
-            xaxis_title="Ano",
-            yaxis_title="Número de Casos",
-            title=dict(
-                text="Total de Violência Doméstica em Pernambuco - ANO",
-                x=0  # Centralizar o título
-            ),
-            template="plotly_white"  # Tema visual mais limpo
-        )
+            # Ajustes de layout
+            fig.update_layout(
+                xaxis=dict(
+                    tickmode="linear",  # Garantir que todos os anos apareçam no eixo X
+                    tick0=df_ano["ANO"].min(),
+                    dtick=1
+                ),
+                xaxis_title="Ano",
+                yaxis_title="Número de Casos",
+                title=dict(
+                    text="Total de Violência Doméstica em Pernambuco - ANO",
+                    x=0  # Centralizar o título
+                ),
+                template="plotly_white"  # Tema visual mais limpo
+            )
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 4: Incidência de Crimes por Ano
     elif analysis == 'Total de Casos por Região Geográfica':
         st.subheader("Total de Casos por Região Geográfica")
 
-        violencia_dm['TOTAL'] = pd.to_numeric(violencia_dm['TOTAL'], errors='coerce')
-
-        # Agrupar os dados por Região Geográfica e Sexo
-        violencia_dm_sexo = violencia_dm.groupby(['REGIAO_GEOGRAFICA', 'SEXO'], as_index=False)['TOTAL'].sum()
-
-        # Gráfico de Barras Empilhadas
-        fig = px.bar(
-            violencia_dm_sexo,
-            x='REGIAO_GEOGRAFICA',
-            y='TOTAL',
-            color='SEXO',
-            title='Total de Casos por Região Geográfica',
-            labels={'TOTAL': 'Total de Casos', 'REGIAO_GEOGRAFICA': 'Região Geográfica'},
-            barmode='stack',  # Configura as barras para serem empilhadas
-            color_discrete_sequence=px.colors.qualitative.Dark24  # Paleta predefinida
-        )
+        def construir():
+            # Agrupar os dados por Região Geográfica e Sexo
+            violencia_dm_sexo = agregar(['REGIAO_GEOGRAFICA', 'SEXO'], filtros=filtros)
+            marcar('consulta', violencia_dm_sexo)
+
+            # Gráfico de Barras Empilhadas
+            fig = px.bar(
+                violencia_dm_sexo,
+                x='REGIAO_GEOGRAFICA',
+                y='TOTAL',
+                color='SEXO',
+                title='Total de Casos por Região Geográfica',
+                labels={'TOTAL': 'Total de Casos', 'REGIAO_GEOGRAFICA': 'Região Geográfica'},
+                barmode='stack',  # Configura as barras para serem empilhadas
+                color_discrete_sequence=px.colors.qualitative.Dark24  # Paleta predefinida
+            )
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 4: Incidência de Crimes por Ano
     elif analysis == 'Crime com Maior Incidência':
         # Subtítulo no Streamlit
         st.subheader("Crime com Maior Incidência por Região Geográfica")
 
-        # Agrupar por REGIAO_GEOGRAFICA e NATUREZA, somando os totais
-        regiao_natureza = violencia_dm.groupby(['REGIAO_GEOGRAFICA', 'NATUREZA'], as_index=False)['TOTAL'].sum()
-
-        # Identificar o crime mais frequente por região
-        crime_mais_frequente = regiao_natureza.loc[
-            regiao_natureza.groupby('REGIAO_GEOGRAFICA')['TOTAL'].idxmax()
-        ]
-
-        # Criar o gráfico de barras
-        fig = px.bar(
-            crime_mais_frequente,
-            x='REGIAO_GEOGRAFICA',
-            y='TOTAL',
-            color='NATUREZA',
-            title='Crime com Maior Incidência por Região Geográfica',
-            labels={
-                'REGIAO_GEOGRAFICA': 'Região Geográfica',
-                'TOTAL': 'Total de Ocorrências',
-                'NATUREZA': 'Natureza do Crime'
-            },
-            color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores para diferenciar crimes
-        )
+        def construir():
+            # Agrupar por REGIAO_GEOGRAFICA e NATUREZA, somando os totais
+            regiao_natureza = agregar(['REGIAO_GEOGRAFICA', 'NATUREZA'], filtros=filtros)
+            marcar('consulta', regiao_natureza)
+
+            # Identificar o crime mais frequente por região
+            crime_mais_frequente = regiao_natureza.loc[
+                regiao_natureza.groupby('REGIAO_GEOGRAFICA')['TOTAL'].idxmax()
+            ]
+            marcar('transformacao', crime_mais_frequente)
+
+            # Criar o gráfico de barras
+            fig = px.bar(
+                crime_mais_frequente,
+                x='REGIAO_GEOGRAFICA',
+                y='TOTAL',
+                color='NATUREZA',
+                title='Crime com Maior Incidência por Região Geográfica',
+                labels={
+                    'REGIAO_GEOGRAFICA': 'Região Geográfica',
+                    'TOTAL': 'Total de Ocorrências',
+                    'NATUREZA': 'Natureza do Crime'
+                },
+                color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores para diferenciar crimes
+            )
 
-        # Ajustar layout
-        fig.update_layout(
-            xaxis_title='Região Geográfica',
-            yaxis_title='Total de Ocorrências',
-            title_x=0,  # Centralizar o título
-            template='plotly_white'
-        )
+            # Ajustar layout
+            fig.update_layout(
+                xaxis_title='Região Geográfica',
+                yaxis_title='Total de Ocorrências',
+                title_x=0,  # Centralizar o título
+                template='plotly_white'
+            )
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 5: Incidência de Crimes por Ano
     elif analysis == 'Top 10 Crimes com maior Relevância':
@@ -201,42 +231,50 @@ def visualizacao():
         # Subtítulo no Streamlit
         st.subheader("10 Crimes Mais Relevantes por Região Geográfica")
 
-        # Agrupar por REGIAO_GEOGRAFICA e NATUREZA, somando os totais
-        regiao_natureza = violencia_dm.groupby(['REGIAO_GEOGRAFICA', 'NATUREZA'], as_index=False)['TOTAL'].sum()
+        def construir():
+            # Agrupar por REGIAO_GEOGRAFICA e NATUREZA, somando os totais
+            regiao_natureza = agregar(['REGIAO_GEOGRAFICA', 'NATUREZA'], filtros=filtros)
+            marcar('consulta', regiao_natureza)
 
-        # Selecionar os 10 crimes mais relevantes por região
-        top_10_crimes_por_regiao = (
-            regiao_natureza.sort_values(['REGIAO_GEOGRAFICA', 'TOTAL'], ascending=[True, False])
-            .groupby('REGIAO_GEOGRAFICA')
-            .head(10)
-        )
+            # Selecionar os 10 crimes mais relevantes por região
+            top_10_crimes_por_regiao = (
+                regiao_natureza.sort_values(['REGIAO_GEOGRAFICA', 'TOTAL'], ascending=[True, False])
+                .groupby('REGIAO_GEOGRAFICA')
+                .head(10)
+            )
+            marcar('transformacao', top_10_crimes_por_regiao)
+
+            # Criar o gráfico de barras
+            fig = px.bar(
+                top_10_crimes_por_regiao,
+                x='REGIAO_GEOGRAFICA',
+                y='TOTAL',
+                color='NATUREZA',
+                title='10 Crimes Mais Relevantes por Região Geográfica',
+                labels={
+                    'REGIAO_GEOGRAFICA': 'Região Geográfica',
+                    'TOTAL': 'Total de Ocorrências',
+                    'NATUREZA': 'Natureza do Crime'
+                },
+                barmode='group',  # Barras agrupadas por região
+                color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores
+            )
 
-        # Criar o gráfico de barras
-        fig = px.bar(
-            top_10_crimes_por_regiao,
-            x='REGIAO_GEOGRAFICA',
-            y='TOTAL',
-            color='NATUREZA',
-            title='10 Crimes Mais Relevantes por Região Geográfica',
-            labels={
-                'REGIAO_GEOGRAFICA': 'Região Geográfica',
-                'TOTAL': 'Total de Ocorrências',
-                'NATUREZA': 'Natureza do Crime'
-            },
-            barmode='group',  # Barras agrupadas por região
-            color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores
-        )
+            # Ajustar layout
+            fig.update_layout(
+                xaxis_title='Região Geográfica',
+                yaxis_title='Total de Ocorrências',
+                title_x=0,  # Centralizar o título
+                template='plotly_white'
+            )
+            return fig
 
-        # Ajustar layout
-        fig.update_layout(
-            xaxis_title='Região Geográfica',
-            yaxis_title='Total de Ocorrências',
-            title_x=0,  # Centralizar o título
-            template='plotly_white'
-        )
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 6: Crimes Por Sexo e Natureza
     elif analysis == 'Crimes Domésticos Por Sexo e Natureza':
@@ -244,83 +282,214 @@ def visualizacao():
         # Subtítulo no Streamlit
         st.subheader("Crimes Domésticos por Sexo e Natureza")
 
-        # Agrupar por SEXO e NATUREZA, somando os totais
-        regiao_natureza = violencia_dm.groupby(['SEXO', 'NATUREZA'], as_index=False)['TOTAL'].sum()
-
-        # Ordenar os dados (apenas organiza, mas sem limitar a quantidade)
-        regiao_natureza = regiao_natureza.sort_values(['SEXO', 'TOTAL'], ascending=[True, False])
-
-        # Criar o gráfico de barras
-        fig = px.bar(
-            regiao_natureza,
-            x='SEXO',
-            y='TOTAL',
-            color='NATUREZA',
-            title='Crimes por Sexo e Natureza',
-            labels={
-                'SEXO': 'Sexo',
-                'TOTAL': 'Total de Ocorrências',
-                'NATUREZA': 'Natureza do Crime'
-            },
-            barmode='group',  # Barras agrupadas por região
-            color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores
-        )
+        def construir():
+            # Agrupar por SEXO e NATUREZA, somando os totais
+            regiao_natureza = agregar(['SEXO', 'NATUREZA'], filtros=filtros)
+            marcar('consulta', regiao_natureza)
+
+            # Ordenar os dados (apenas organiza, mas sem limitar a quantidade)
+            regiao_natureza = regiao_natureza.sort_values(['SEXO', 'TOTAL'], ascending=[True, False])
+            marcar('transformacao', regiao_natureza)
+
+            # Criar o gráfico de barras
+            fig = px.bar(
+                regiao_natureza,
+                x='SEXO',
+                y='TOTAL',
+                color='NATUREZA',
+                title='Crimes por Sexo e Natureza',
+                labels={
+                    'SEXO': 'Sexo',
+                    'TOTAL': 'Total de Ocorrências',
+                    'NATUREZA': 'Natureza do Crime'
+                },
+                barmode='group',  # Barras agrupadas por região
+                color_discrete_sequence=px.colors.qualitative.Bold  # Paleta de cores
+            )
 
-        # Ajustar layout
-        fig.update_layout(
-            xaxis_title='Sexo',
-            yaxis_title='Total de Ocorrências',
-            title_x=0.5,  # Centralizar o título
-            template='plotly_white'
-        )
+            # Ajustar layout
+            fig.update_layout(
+                xaxis_title='Sexo',
+                yaxis_title='Total de Ocorrências',
+                title_x=0.5,  # Centralizar o título
+                template='plotly_white'
+            )
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit
         st.plotly_chart(fig)
+        marcar('renderizacao')
 
     # Análise 7: Crimes Por Sexo e Natureza
     elif analysis == 'Mapa de Crimes por Município':
         # Subtítulo no Streamlit
         st.subheader("Mapa de Calor dos Crimes Domésticos em Pernambuco")
 
-        # Carregar o arquivo GeoJSON do mapa de Pernambuco
-        with open('pernambuco_municipios.json', 'r') as file:
-            geojson_pernambuco = json.load(file)
-
-        # Agrupar os dados por município (ou região)
-        dados_agrupados = violencia_dm.groupby('MUNICIPIO', as_index=False).agg({'TOTAL': 'sum'})
-
-        # Adicionar uma coluna com a chave de identificação do GeoJSON (caso necessário)
-        # Certifique-se de que os nomes dos municípios no GeoJSON correspondem à coluna MUNICIPIO do DataFrame
-        dados_agrupados['MUNICIPIO'] = dados_agrupados[
-            'MUNICIPIO'].str.title()  # Normalizar nomes para evitar discrepâncias
-
-        # Criar o mapa utilizando choropleth
-        fig = px.choropleth(
-            dados_agrupados,
-            geojson=geojson_pernambuco,
-            locations='MUNICIPIO',  # Nome do município no DataFrame
-            featureidkey='properties.name',  # Nome do município no GeoJSON (ajuste conforme necessário)
-            color='TOTAL',  # Total de ocorrências
-            color_continuous_scale='Viridis',  # Paleta de cores
-            title='Mapa de Calor dos Crimes Domésticos',
-            labels={'TOTAL': 'Total de Ocorrências'}
-        )
+        detalhe = st.sidebar.select_slider('Detalhe do mapa:', options=list(NIVEIS_DETALHE), value='Médio')
 
-        # Ajustar layout do mapa
-        fig.update_geos(
-            fitbounds="locations",  # Ajustar o zoom ao mapa
-            visible=False  # Ocultar linhas de grade
-        )
+        def construir():
+            # GeoJSON do mapa de Pernambuco simplificado (carregado e processado uma única vez por processo)
+            geojson_pernambuco = geojson_simplificado(NIVEIS_DETALHE[detalhe])
+            marcar('geojson', geojson_pernambuco['features'])
 
-        # Ajustar o layout para ocupar toda a tela
-        fig.update_layout(
-            title_x=0,  # Centralizar o título
-            template='plotly_white',
-            margin={"r": 0, "t": 50, "l": 0, "b": 0}  # Reduzir margens externas
-        )
+            # Agrupar os dados por município (ou região)
+            dados_agrupados = agregar(['MUNICIPIO'], filtros=filtros)
+            marcar('consulta', dados_agrupados)
+
+            # Adicionar o código IBGE do município (índice gravado na carga), chave das feições no GeoJSON
+            dados_agrupados = (
+                dados_agrupados.merge(municipios_ibge(), on='MUNICIPIO')
+                .dropna(subset=['ID_IBGE'])
+                .astype({'ID_IBGE': int})
+            )
+            marcar('transformacao', dados_agrupados)
+
+            # Criar o mapa utilizando choropleth
+            fig = px.choropleth(
+                dados_agrupados,
+                geojson=geojson_pernambuco,
+                locations='ID_IBGE',  # Código IBGE do município (feature.id no GeoJSON)
+                hover_name='MUNICIPIO',
+                color='TOTAL',  # Total de ocorrências
+                color_continuous_scale='Viridis',  # Paleta de cores
+                title='Mapa de Calor dos Crimes Domésticos',
+                labels={'TOTAL': 'Total de Ocorrências'}
+            )
+
+            # Ajustar layout do mapa
+            fig.update_geos(
+                fitbounds="locations",  # Ajustar o zoom ao mapa
+                visible=False  # Ocultar linhas de grade
+            )
+
+            # Ajustar o layout para ocupar toda a tela
+            fig.update_layout(
+                title_x=0,  # Centralizar o título
+                template='plotly_white',
+                margin={"r": 0, "t": 50, "l": 0, "b": 0}  # Reduzir margens externas
+            )
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir, extras=detalhe)
+        marcar('figura')
 
         # Exibir o gráfico no Streamlit ocupando toda a largura do container
         st.plotly_chart(fig, use_container_width=True)
+        marcar('renderizacao')
+
+        # Informar os municípios dos microdados que não foram encontrados no GeoJSON
+        sem_correspondencia = municipios_sem_correspondencia()
+        if sem_correspondencia:
+            st.warning(
+                f"{len(sem_correspondencia)} município(s) sem correspondência no mapa: "
+                + ', '.join(sem_correspondencia)
+            )
+
+    # Análises 8 a 10: respondidas pelos cubos de contagem gravados na carga (recorte e soma de arrays NumPy)
+    elif analysis == 'Mapa de Calor - Mês x Dia da Semana':
+        st.subheader("Ocorrências por Mês e Dia da Semana")
+
+        def construir():
+            calendario = reduzir(obter_cubo('temporal', filtros), ['DIA_SEMANA', 'MES'])
+            marcar('consulta', calendario)
+            matriz = calendario.pivot(index='DIA_SEMANA', columns='MES', values='TOTAL')
+            marcar('transformacao', matriz)
+
+            fig = px.imshow(
+                matriz.to_numpy(),
+                x=NOMES_MESES,
+                y=NOMES_DIAS,
+                color_continuous_scale='Viridis',
+                aspect='auto',
+                text_auto=True,
+                title='Total de Ocorrências por Mês e Dia da Semana',
+                labels={'x': 'Mês', 'y': 'Dia da Semana', 'color': 'Total de Ocorrências'}
+            )
+            fig.update_layout(title_x=0, template='plotly_white')
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir)
+        marcar('figura')
+
+        st.plotly_chart(fig)
+        marcar('renderizacao')
+
+    elif analysis == 'Faixa Etária x Natureza ao Longo dos Anos':
+        st.subheader("Evolução por Faixa Etária e Natureza do Crime")
+
+        cubo = obter_cubo('temporal', filtros)
+        natureza = st.sidebar.selectbox('Natureza do crime:', ['Todas'] + cubo['rotulos']['NATUREZA'].tolist())
+
+        def construir():
+            recorte = cubo if natureza == 'Todas' else fatiar(cubo, [('NATUREZA', (natureza,))])
+            faixa_ano = reduzir(recorte, ['ANO', 'FAIXA_IDADE'])
+            marcar('consulta', faixa_ano)
+
+            fig = px.line(
+                faixa_ano,
+                x='ANO',
+                y='TOTAL',
+                color='FAIXA_IDADE',
+                markers=True,
+                title=f'Ocorrências por Faixa Etária - {natureza}',
+                labels={'ANO': 'Ano', 'TOTAL': 'Total de Ocorrências', 'FAIXA_IDADE': 'Faixa Etária'}
+            )
+            fig.update_layout(title_x=0, template='plotly_white')
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir, extras=natureza)
+        marcar('figura')
+
+        st.plotly_chart(fig)
+        marcar('renderizacao')
+
+        # Participação de cada faixa etária em cada natureza (todo o período filtrado)
+        participacao = reduzir(cubo, ['NATUREZA', 'FAIXA_IDADE']).pivot(
+            index='NATUREZA', columns='FAIXA_IDADE', values='TOTAL'
+        )
+        st.dataframe((participacao.div(participacao.sum(axis=1), axis=0) * 100).round(1))
+        marcar('renderizacao', participacao)
+
+    elif analysis == 'Sazonalidade por Município':
+        st.subheader("Sazonalidade Mensal por Município")
+
+        cubo = obter_cubo('municipal', filtros)
+        # Municípios ordenados pelo total de ocorrências no recorte
+        totais = reduzir(cubo, ['MUNICIPIO']).query('TOTAL > 0').sort_values('TOTAL', ascending=False)
+        municipio = st.sidebar.selectbox('Município:', totais['MUNICIPIO'].tolist())
+
+        def construir():
+            mensal = reduzir(fatiar(cubo, [('MUNICIPIO', (municipio,))]), ['ANO', 'MES'])
+            marcar('consulta', mensal)
+            # Meses ainda não publicados (ex.: após a última DATA_FATO) não entram como zero na série nem na média
+            mensal = mensal[meses_observados(cubo, mensal)]
+            mensal = mensal.assign(MES=[NOMES_MESES[mes - 1] for mes in mensal['MES']])
+            media = mensal.groupby('MES', sort=False)['TOTAL'].mean()
+            marcar('transformacao', mensal)
+
+            fig = px.line(
+                mensal.astype({'ANO': str}),
+                x='MES',
+                y='TOTAL',
+                color='ANO',
+                title=f'Ocorrências por Mês - {municipio}',
+                labels={'MES': 'Mês', 'TOTAL': 'Total de Ocorrências', 'ANO': 'Ano'}
+            )
+            fig.add_trace(go.Scatter(
+                x=media.index, y=media.values, mode='lines+markers', name='Média',
+                line={'color': 'black', 'width': 4}
+            ))
+            fig.update_layout(title_x=0, template='plotly_white')
+            return fig
+
+        fig = figura_cacheada(analysis, filtros, construir, extras=municipio)
+        marcar('figura')
+
+        st.plotly_chart(fig)
+        marcar('renderizacao')
 
 
 # Executar o aplicativo